@@ -0,0 +1,82 @@
+"""
+Benchmarks the registered extractors on real DCE files.
+
+    python benchmark_extractors.py path/to/dce_dir [more files or dirs] [--repeat 3]
+
+For every file it reports wall time, peak Python memory and extracted
+characters. DOCX files are also run through the previous python-docx
+implementation (paragraphs only) when python-docx is installed, so the
+streaming extractor can be compared against it.
+"""
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+
+from extractors import extract_text, get_extractor, clean_extracted_text
+
+try:
+    import docx
+except ImportError:
+    docx = None
+
+
+def legacy_extract_text_from_docx(file_path):
+    """The python-docx implementation the streaming extractor replaced."""
+    try:
+        doc = docx.Document(file_path)
+        text = "\n".join(p.text for p in doc.paragraphs if p.text.strip())
+        return clean_extracted_text(text)
+    except Exception:
+        return ""
+
+
+def measure(func, file_path, repeat):
+    best = None
+    peak = 0
+    text = ""
+    for _ in range(repeat):
+        tracemalloc.start()
+        start = time.perf_counter()
+        text = func(file_path) or ""
+        elapsed = time.perf_counter() - start
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        best = elapsed if best is None else min(best, elapsed)
+    return best, peak, len(text)
+
+
+def iter_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for f in sorted(files):
+                    yield os.path.join(root, f)
+        else:
+            yield path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark DCE text extractors.")
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print(f"{'file':<50} {'extractor':<32} {'best s':>8} {'peak MB':>8} {'chars':>9}")
+    for file_path in iter_files(args.paths):
+        func = get_extractor(file_path)
+        if func is None:
+            continue
+        name = os.path.basename(file_path)[:50]
+        candidates = [(func.__name__, extract_text)]
+        if docx is not None and func.__name__ == "extract_text_from_docx":
+            candidates.append(("python-docx (legacy)", legacy_extract_text_from_docx))
+        for label, candidate in candidates:
+            best, peak, chars = measure(candidate, file_path, args.repeat)
+            print(f"{name:<50} {label:<32} {best:>8.3f} {peak / 1e6:>8.1f} {chars:>9}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
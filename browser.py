@@ -0,0 +1,97 @@
+"""
+Chrome WebDriver setup, and the pool of sessions shared by the portals and
+the backfill windows of one run.
+"""
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+
+PAGE_LOAD_TIMEOUT = 40
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "3"))
+
+
+def create_driver(download_dir):
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless=chrome")  # more stable on CI
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--window-size=1920,1080")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    options.add_experimental_option("useAutomationExtension", False)
+
+    prefs = {
+        "download.default_directory": download_dir,
+        "download.prompt_for_download": False,
+        "download.directory_upgrade": True,
+    }
+    options.add_experimental_option("prefs", prefs)
+
+    service = Service()
+    driver = webdriver.Chrome(service=service, options=options)
+    driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
+    return driver
+
+
+class BrowserPool:
+    """
+    Up to `size` Chrome sessions, started on demand and handed out one
+    caller at a time. Downloads are redirected per tender (downloads.py), so
+    any session can serve any portal; a session must not be shared between
+    callers, its tabs have a single download path.
+    """
+
+    def __init__(self, download_dir, size=BROWSER_POOL_SIZE):
+        self.download_dir = download_dir
+        self.size = max(1, size)
+        self.idle = queue.Queue()
+        self.drivers = []
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            create = len(self.drivers) < self.size
+            if create:
+                self.drivers.append(None)  # reserve the slot while Chrome starts
+        if not create:
+            return self.idle.get()
+        try:
+            driver = create_driver(self.download_dir)
+        except Exception:
+            with self.lock:
+                self.drivers.remove(None)
+            raise
+        with self.lock:
+            self.drivers[self.drivers.index(None)] = driver
+        print(f"✅ WebDriver initialized ({len(self.drivers)}/{self.size}).")
+        return driver
+
+    def release(self, driver):
+        self.idle.put(driver)
+
+    @contextmanager
+    def session(self):
+        driver = self.acquire()
+        try:
+            yield driver
+        finally:
+            self.release(driver)
+
+    def close(self):
+        for driver in self.drivers:
+            if driver is None:
+                continue
+            try:
+                driver.quit()
+            except Exception:
+                pass
+        self.drivers = []
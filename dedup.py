@@ -0,0 +1,228 @@
+"""
+Near-duplicate tender detection (MinHash + LSH banding) across portals
+and re-publications.
+
+Two kinds of signatures are kept in a small SQLite index:
+  - "listing":  normalized objet + acheteur, checked before the DCE download
+  - "document": listing key + extracted text, checked before webhook delivery
+A tender that matches an already delivered one is sent as a lightweight
+reference to the original analysis instead of being processed again.
+
+Portals are processed concurrently and a delivery can take 20 minutes, so
+a tender's signatures are recorded as pending as soon as it is claimed,
+then confirmed once delivered or discarded when the delivery fails. A
+duplicate of a pending tender points at it with "pending": true.
+
+Only signatures of the last DEDUP_WINDOW_DAYS are matched, and they also
+need the same date_limite when both tenders have one: a relaunch after an
+infructueux call or a yearly renewal keeps the objet and the buyer, but
+gets a new deadline and must be downloaded and analysed again.
+"""
+import os
+import re
+import json
+import random
+import sqlite3
+import hashlib
+import unicodedata
+from datetime import datetime, timedelta
+
+STATE_DIR = os.getenv("TENDER_STATE_DIR", os.path.join(os.getcwd(), "state"))
+DEFAULT_DB_PATH = os.getenv("DEDUP_DB_PATH", os.path.join(STATE_DIR, "tender_dedup.db"))
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+MAX_TEXT_CHARS = 20000  # the first pages are enough to recognize a DCE
+# Cross-portal copies and re-publications show up within days
+DEDUP_WINDOW_DAYS = float(os.getenv("DEDUP_WINDOW_DAYS", "45"))
+
+THRESHOLDS = {
+    "listing": 0.9,    # short text, stay strict so distinct lots are not merged
+    "document": 0.85,
+}
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240101)
+_PERMS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+_NON_WORD_RE = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def normalize_text(text):
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return _NON_WORD_RE.sub(" ", text.lower()).strip()
+
+
+def shingles(text, k=SHINGLE_SIZE):
+    words = normalize_text(text[:MAX_TEXT_CHARS]).split()
+    if len(words) < k:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+
+def minhash(text):
+    hashes = [
+        int.from_bytes(hashlib.blake2b(sh.encode("utf-8"), digest_size=8).digest(), "big")
+        for sh in shingles(text)
+    ]
+    if not hashes:
+        return None
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMS]
+
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity between two MinHash signatures."""
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / float(NUM_PERM)
+
+
+def _normalize_deadline(value):
+    return " ".join((value or "").split()) or None
+
+
+def band_keys(signature):
+    for band in range(BANDS):
+        chunk = signature[band * ROWS:(band + 1) * ROWS]
+        yield band, hashlib.blake2b(json.dumps(chunk).encode(), digest_size=8).hexdigest()
+
+
+class DuplicateIndex:
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=30)  # portals write from their own threads
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS signatures (
+                kind TEXT NOT NULL,
+                portal TEXT NOT NULL,
+                reference TEXT NOT NULL,
+                signature TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                PRIMARY KEY (kind, portal, reference)
+            );
+            CREATE TABLE IF NOT EXISTS bands (
+                kind TEXT NOT NULL,
+                band INTEGER NOT NULL,
+                bucket TEXT NOT NULL,
+                portal TEXT NOT NULL,
+                reference TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_bands_lookup ON bands (kind, band, bucket);
+        """)
+        # Indexes created before pending signatures / deadlines
+        columns = [r[1] for r in self.conn.execute("PRAGMA table_info(signatures)")]
+        if "pending" not in columns:
+            self.conn.execute("ALTER TABLE signatures ADD COLUMN pending INTEGER NOT NULL DEFAULT 0")
+        if "deadline" not in columns:
+            self.conn.execute("ALTER TABLE signatures ADD COLUMN deadline TEXT")
+        self.conn.commit()
+
+    def find_duplicate(self, kind, text, portal, reference, threshold=None, deadline=None, window_days=DEDUP_WINDOW_DAYS):
+        """
+        Returns {"portal", "reference", "similarity", "pending"} of the closest
+        tender indexed in the last window_days above the threshold, or None.
+        The tender itself is ignored, and so is a tender whose deadline is
+        known and differs from the given one.
+        """
+        signature = minhash(text)
+        if signature is None:
+            return None
+        threshold = THRESHOLDS[kind] if threshold is None else threshold
+        since = (datetime.now() - timedelta(days=window_days)).isoformat()
+        deadline = _normalize_deadline(deadline)
+
+        candidates = set()
+        for band, bucket in band_keys(signature):
+            rows = self.conn.execute(
+                "SELECT portal, reference FROM bands WHERE kind = ? AND band = ? AND bucket = ?",
+                (kind, band, bucket),
+            )
+            candidates.update(rows.fetchall())
+        candidates.discard((portal, reference))
+
+        best = None
+        for cand_portal, cand_ref in candidates:
+            row = self.conn.execute(
+                "SELECT signature, pending, deadline FROM signatures "
+                "WHERE kind = ? AND portal = ? AND reference = ? AND created_at >= ?",
+                (kind, cand_portal, cand_ref, since),
+            ).fetchone()
+            if not row or (deadline and row[2] and row[2] != deadline):
+                continue
+            score = similarity(signature, json.loads(row[0]))
+            if score >= threshold and (best is None or score > best["similarity"]):
+                best = {"portal": cand_portal, "reference": cand_ref, "similarity": round(score, 3),
+                        "pending": bool(row[1])}
+        return best
+
+    def add(self, kind, text, portal, reference, pending=False, deadline=None):
+        signature = minhash(text)
+        if signature is None:
+            return
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM bands WHERE kind = ? AND portal = ? AND reference = ?",
+                (kind, portal, reference),
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO signatures (kind, portal, reference, signature, created_at, pending, deadline) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (kind, portal, reference, json.dumps(signature), datetime.now().isoformat(), int(pending),
+                 _normalize_deadline(deadline)),
+            )
+            self.conn.executemany(
+                "INSERT INTO bands VALUES (?, ?, ?, ?, ?)",
+                [(kind, band, bucket, portal, reference) for band, bucket in band_keys(signature)],
+            )
+
+    def confirm(self, portal, reference):
+        """The tender was delivered: its pending signatures become regular ones."""
+        with self.conn:
+            self.conn.execute(
+                "UPDATE signatures SET pending = 0 WHERE portal = ? AND reference = ?", (portal, reference)
+            )
+
+    def discard(self, portal, reference):
+        """Drops the tender's pending signatures (delivery failed, or it turned out to be a duplicate)."""
+        with self.conn:
+            kinds = [r[0] for r in self.conn.execute(
+                "SELECT kind FROM signatures WHERE portal = ? AND reference = ? AND pending = 1", (portal, reference)
+            )]
+            for kind in kinds:
+                self.conn.execute(
+                    "DELETE FROM bands WHERE kind = ? AND portal = ? AND reference = ?", (kind, portal, reference)
+                )
+            self.conn.execute(
+                "DELETE FROM signatures WHERE portal = ? AND reference = ? AND pending = 1", (portal, reference)
+            )
+
+    def close(self):
+        self.conn.close()
+
+
+def _check_relaunch():
+    """Same objet and buyer: a copy on the other portal matches, a relaunch or an old analysis does not."""
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        index = DuplicateIndex(os.path.join(tmp, "dedup.db"))
+        key = "Travaux d'entretien des espaces verts de la commune\nCommune de Rabat"
+        index.add("listing", key, "marchespublics", "12/2025", deadline="15/03/2025 10:00")
+        checks = [
+            ("copy on the other portal", index.find_duplicate("listing", key, "cdg", "A1", deadline="15/03/2025 10:00"), True),
+            ("relaunch after infructueux", index.find_duplicate("listing", key, "cdg", "A2", deadline="30/04/2025 10:00"), False),
+        ]
+        index.conn.execute("UPDATE signatures SET created_at = ?", ((datetime.now() - timedelta(days=400)).isoformat(),))
+        checks.append(("yearly renewal", index.find_duplicate("listing", key, "marchespublics", "9/2026"), False))
+        index.close()
+    failures = 0
+    for name, found, expected in checks:
+        if (found is not None) != expected:
+            failures += 1
+            print(f"❌ {name}: got {found}, expected {'a match' if expected else 'none'}")
+    print(f"{len(checks) - failures}/{len(checks)} dedup cases pass")
+    return failures
+
+
+if __name__ == "__main__":
+    raise SystemExit(1 if _check_relaunch() else 0)
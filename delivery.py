@@ -0,0 +1,46 @@
+"""
+n8n webhook delivery, off the scraping threads.
+
+A POST can take up to 20 minutes while the LLM analyses the tender, so the
+portals hand their payloads to a small shared pool of delivery threads and
+go on with the next download. Each submit returns a Future of
+(delivered, response); the portal thread does the bookkeeping itself, so
+its SQLite connections never cross threads.
+"""
+import os
+import requests
+from concurrent.futures import ThreadPoolExecutor
+
+DELIVERY_WORKERS = int(os.getenv("DELIVERY_WORKERS", "2"))
+DELIVERY_TIMEOUT = 1200
+
+
+def post_payload(webhook, payload, label=""):
+    """POSTs one tender; returns (delivered, response or None)."""
+    print(f"  - 📤 {label}Sending to n8n (Payload len: {len(payload['merged_text'])})...")
+    try:
+        resp = requests.post(webhook, json=payload, timeout=DELIVERY_TIMEOUT)
+        if resp.status_code == 200:
+            print(f"  - ✅ {label}Sent to n8n successfully")
+            return True, resp
+        print(f"  - ❌ {label}n8n returned error {resp.status_code}")
+    except requests.exceptions.ReadTimeout:
+        # Catch specific timeout from slow Ollama, but consider it success-ish
+        print(f"  - ⚠️ {label}TIMEOUT: n8n/Ollama took > {DELIVERY_TIMEOUT}s (Data was likely sent).")
+        return True, None
+    except requests.exceptions.ConnectionError:
+        print(f"  - ❌ {label}Connection Error: Could not reach n8n server.")
+    except Exception as e:
+        print(f"  - ❌ {label}General n8n error: {e}")
+    return False, None
+
+
+class DeliveryQueue:
+    def __init__(self, workers=DELIVERY_WORKERS):
+        self.pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="delivery")
+
+    def submit(self, webhook, payload, label=""):
+        return self.pool.submit(post_payload, webhook, payload, label)
+
+    def close(self):
+        self.pool.shutdown(wait=True)
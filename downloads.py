@@ -0,0 +1,94 @@
+"""
+Per-tender download directories.
+
+Every DCE download is pointed at its own directory through the DevTools
+protocol, so the archive found there can only belong to that tender and
+cleanup never touches another tender's files. Overlapping downloads in
+different browser sessions no longer race on a shared downloads_temp.
+
+The download path is a setting of the browser context, and every tab of a
+Chrome shares its default context: a session must download one tender at a
+time, which BrowserPool ensures by handing each session to a single caller.
+"""
+import os
+import re
+import time
+import uuid
+import shutil
+
+_UNSAFE_CHARS_RE = re.compile(r"[^\w.-]+")
+_PARTIAL_SUFFIXES = (".crdownload", ".tmp", ".part")
+
+
+def tender_download_dir(base_dir, reference):
+    """Unique directory for one tender download, e.g. base/AO_12_2025_1a2b3c4d."""
+    safe = _UNSAFE_CHARS_RE.sub("_", str(reference)).strip("_")[:80] or "tender"
+    path = os.path.join(base_dir, f"{safe}_{uuid.uuid4().hex[:8]}")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def set_download_dir(driver, path):
+    """
+    Sends the next downloads of this browser context to path.
+    Scoped to the current tab's browser context when Chrome reports it,
+    falling back to the page-level command on older Chrome versions. The
+    context is shared by all tabs of the browser, so two tabs downloading
+    at once would overwrite each other's path.
+    """
+    os.makedirs(path, exist_ok=True)
+    params = {"behavior": "allow", "downloadPath": path, "eventsEnabled": True}
+    try:
+        info = driver.execute_cdp_cmd("Target.getTargetInfo", {}).get("targetInfo", {})
+        if info.get("browserContextId"):
+            params["browserContextId"] = info["browserContextId"]
+        driver.execute_cdp_cmd("Browser.setDownloadBehavior", params)
+    except Exception:
+        driver.execute_cdp_cmd("Page.setDownloadBehavior", {"behavior": "allow", "downloadPath": path})
+
+
+def reset_dir(path):
+    remove_dir(path)
+    os.makedirs(path, exist_ok=True)
+
+
+def remove_dir(path):
+    if path and os.path.exists(path):
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def wait_for_download_complete(directory, timeout=120):
+    """
+    Waits for Chrome temp / incomplete files to finish downloading in directory.
+    Returns the final downloaded file path.
+    """
+    elapsed = 0
+    stable_count = 0
+    last_size = -1
+
+    while elapsed < timeout:
+        files = [f for f in os.listdir(directory)
+                 if not f.endswith(_PARTIAL_SUFFIXES) and not f.startswith(".com.google.Chrome.")
+                 and os.path.isfile(os.path.join(directory, f))]
+        partial = any(f.endswith(_PARTIAL_SUFFIXES) for f in os.listdir(directory))
+        if files and not partial:
+            file_path = max((os.path.join(directory, f) for f in files), key=os.path.getmtime)
+            size = os.path.getsize(file_path)
+            if size == last_size:
+                stable_count += 1
+            else:
+                stable_count = 0
+                last_size = size
+
+            # If size hasn’t changed for 3 consecutive checks (~3 sec)
+            if stable_count >= 3:
+                return file_path
+        else:
+            last_size = -1
+            stable_count = 0
+
+        time.sleep(1)
+        elapsed += 1
+
+    print("⚠️ Timeout waiting for download to finish.")
+    return None
@@ -0,0 +1,382 @@
+"""
+Text extractors for the files found in a DCE, behind one registry keyed by
+file extension and sniffed MIME type.
+
+    text = extract_text(path)   # None when the format is not supported
+
+The pipeline, caches and benchmarks all go through extract_text so every
+caller sees the same formats and the same cleaning.
+"""
+import os
+import re
+import codecs
+import zipfile
+import subprocess
+import unicodedata
+import xml.etree.ElementTree as ET
+
+import fitz  # PyMuPDF
+import openpyxl
+
+from ocr import ocr_page, render_page
+
+PDF_PAGE_LIMIT = 10
+SPREADSHEET_ROW_LIMIT = 5000  # BPU / DQE rarely go beyond a few hundred rows
+ANTIWORD_TIMEOUT = 60
+
+PDF_MIME = "application/pdf"
+DOC_MIME = "application/msword"
+OLE_MIME = "application/x-ole-storage"
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+ODT_MIME = "application/vnd.oasis.opendocument.text"
+ODS_MIME = "application/vnd.oasis.opendocument.spreadsheet"
+RTF_MIME = "application/rtf"
+ZIP_MIME = "application/zip"
+
+EXTRACTORS = {}       # extension -> function
+MIME_EXTRACTORS = {}  # sniffed MIME type -> function
+
+
+def register_extractor(extensions=(), mime_types=()):
+    """Registers func(file_path, **options) -> str for the given extensions / MIME types."""
+    def decorator(func):
+        for ext in extensions:
+            EXTRACTORS[ext.lower()] = func
+        for mime in mime_types:
+            MIME_EXTRACTORS[mime] = func
+        return func
+    return decorator
+
+
+def clean_extracted_text(text):
+    text = unicodedata.normalize("NFKC", text)
+    text = re.sub(r"\n{2,}", "\n", text)
+    text = re.sub(r"[ \t]+", " ", text)
+    text = re.sub(r"Page\s*\d+\s*/\s*\d+", "", text, flags=re.IGNORECASE)
+    text = re.sub(r"[\u0000-\u0009\u000b-\u001f]+", "", text)
+    cleaned_lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
+    pretty = "\n".join(cleaned_lines)
+    pretty = re.sub(r"\n{3,}", "\n\n", pretty)
+    return pretty.strip()
+
+
+# -----------------------------
+# FORMAT DETECTION
+# -----------------------------
+def _sniff_zip(file_path):
+    try:
+        with zipfile.ZipFile(file_path) as zf:
+            names = set(zf.namelist())
+            if "mimetype" in names:
+                return zf.read("mimetype").decode("ascii", errors="ignore").strip()
+            if "word/document.xml" in names:
+                return DOCX_MIME
+            if "xl/workbook.xml" in names:
+                return XLSX_MIME
+    except (zipfile.BadZipFile, OSError):
+        return None
+    return ZIP_MIME
+
+
+def sniff_mime(file_path):
+    """Detects the file type from its magic bytes, whatever its extension says."""
+    try:
+        with open(file_path, "rb") as f:
+            head = f.read(8)
+    except OSError:
+        return None
+    if head.startswith(b"%PDF"):
+        return PDF_MIME
+    if head.startswith(b"PK\x03\x04"):
+        return _sniff_zip(file_path)
+    if head.startswith(b"\xd0\xcf\x11\xe0"):
+        return OLE_MIME  # .doc or .xls, the extension decides
+    if head.startswith(b"{\\rtf"):
+        return RTF_MIME
+    return None
+
+
+def get_extractor(file_path):
+    func = MIME_EXTRACTORS.get(sniff_mime(file_path))
+    if func is None:
+        func = EXTRACTORS.get(os.path.splitext(file_path)[1].lower())
+    return func
+
+
+def extract_text(file_path, **options):
+    """Returns the cleaned text of the file, or None when its format is unsupported."""
+    func = get_extractor(file_path)
+    if func is None:
+        return None
+    return func(file_path, **options)
+
+
+# -----------------------------
+# EXTRACTORS
+# -----------------------------
+@register_extractor((".pdf",), (PDF_MIME,))
+def extract_text_from_pdf(file_path, page_limit=PDF_PAGE_LIMIT, partial=None, **options):
+    """partial, when given, is called with the text read so far after every page."""
+    text = ""
+    try:
+        doc = fitz.open(file_path)
+    except Exception:
+        return ""
+    try:
+        page_count = min(len(doc), page_limit)
+        try:
+            for i in range(page_count):
+                text += doc[i].get_text("text") + "\n"
+                if partial is not None:
+                    partial(text)
+        except Exception:
+            text = ""
+        if len(text.strip()) < 50:
+            # Scanned document: rasterize the open pages and OCR them
+            try:
+                languages = {}  # shared by the pages of this document
+                for i in range(page_count):
+                    text += ocr_page(render_page(doc[i]), languages) + "\n"
+                    if partial is not None:
+                        partial(text)
+            except Exception as e:
+                print(f"⚠️ OCR failed for {file_path}: {e}")
+    finally:
+        doc.close()
+    return clean_extracted_text(text)
+
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_W_TEXT = _W + "t"
+_W_PARAGRAPH = _W + "p"
+_W_CELL = _W + "tc"
+_W_ROW = _W + "tr"
+_W_TABLE = _W + "tbl"
+_W_BREAKS = {_W + "tab": " ", _W + "br": "\n", _W + "cr": "\n"}
+
+
+@register_extractor((".docx",), (DOCX_MIME,))
+def extract_text_from_docx(file_path, **options):
+    """
+    One streaming pass over word/document.xml: paragraphs and table rows
+    (cells joined by ' | ') come out in document order.
+    """
+    lines = []
+    para = []
+    cells = []   # stack of cell paragraph lists, one per open w:tc
+    rows = []    # stack of row cell lists, one per open w:tr
+    try:
+        with zipfile.ZipFile(file_path) as zf, zf.open("word/document.xml") as xml:
+            for event, elem in ET.iterparse(xml, events=("start", "end")):
+                tag = elem.tag
+                if event == "start":
+                    if tag == _W_CELL:
+                        cells.append([])
+                    elif tag == _W_ROW:
+                        rows.append([])
+                    continue
+
+                if tag == _W_TEXT:
+                    para.append(elem.text or "")
+                elif tag in _W_BREAKS:
+                    para.append(_W_BREAKS[tag])
+                elif tag == _W_PARAGRAPH:
+                    text = "".join(para).strip()
+                    para = []
+                    if text:
+                        (cells[-1] if cells else lines).append(text)
+                    elem.clear()
+                elif tag == _W_CELL:
+                    cell_text = " ".join(cells.pop())
+                    if rows:
+                        rows[-1].append(cell_text)
+                elif tag == _W_ROW:
+                    row_text = " | ".join(c for c in rows.pop() if c)
+                    if row_text:
+                        # A nested table row belongs to the enclosing cell
+                        (cells[-1] if cells else lines).append(row_text)
+                    elem.clear()
+                elif tag == _W_TABLE:
+                    elem.clear()
+    except Exception as e:
+        print(f"⚠️ DOCX read failed for {file_path}: {e}")
+    return clean_extracted_text("\n".join(lines))
+
+
+@register_extractor((".doc",), (DOC_MIME,))
+def extract_text_from_doc(file_path, **options):
+    try:
+        process = subprocess.run(["antiword", file_path], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                 timeout=ANTIWORD_TIMEOUT)
+        text = process.stdout.decode("utf-8", errors="ignore")
+        return clean_extracted_text(text)
+    except subprocess.TimeoutExpired:
+        print(f"⚠️ Antiword timed out after {ANTIWORD_TIMEOUT}s on {file_path}")
+        return ""
+    except Exception as e:
+        print(f"⚠️ Antiword failed for {file_path}: {e}")
+        return ""
+
+
+@register_extractor((".xlsx", ".xlsm"), (XLSX_MIME,))
+def extract_text_from_xlsx(file_path, row_limit=SPREADSHEET_ROW_LIMIT, **options):
+    """Streams rows with openpyxl read-only mode, the workbook is never fully loaded."""
+    lines = []
+    try:
+        wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    except Exception as e:
+        print(f"⚠️ openpyxl failed for {file_path}: {e}")
+        return ""
+    try:
+        for ws in wb.worksheets:
+            lines.append(f"[{ws.title}]")
+            for i, row in enumerate(ws.iter_rows(values_only=True)):
+                if i >= row_limit:
+                    break
+                cells = [str(c).strip() for c in row if c is not None and str(c).strip()]
+                if cells:
+                    lines.append(" | ".join(cells))
+    except Exception as e:
+        print(f"⚠️ Spreadsheet read failed for {file_path}: {e}")
+    finally:
+        wb.close()
+    return clean_extracted_text("\n".join(lines))
+
+
+_ODF_TEXT = "urn:oasis:names:tc:opendocument:xmlns:text:1.0"
+_ODF_TABLE = "urn:oasis:names:tc:opendocument:xmlns:table:1.0"
+_ODF_PARAGRAPHS = {f"{{{_ODF_TEXT}}}p", f"{{{_ODF_TEXT}}}h"}
+_ODF_CELL = f"{{{_ODF_TABLE}}}table-cell"
+_ODF_ROW = f"{{{_ODF_TABLE}}}table-row"
+
+
+@register_extractor((".odt", ".ods"), (ODT_MIME, ODS_MIME))
+def extract_text_from_odf(file_path, row_limit=SPREADSHEET_ROW_LIMIT, **options):
+    """Iterparses content.xml from the zip member, paragraphs and table rows in order."""
+    lines = []
+    rows = 0
+    cell_depth = 0
+    try:
+        with zipfile.ZipFile(file_path) as zf, zf.open("content.xml") as content:
+            for event, elem in ET.iterparse(content, events=("start", "end")):
+                if elem.tag == _ODF_CELL:
+                    cell_depth += 1 if event == "start" else -1
+                if event != "end":
+                    continue
+                if elem.tag in _ODF_PARAGRAPHS and cell_depth == 0:
+                    text = "".join(elem.itertext()).strip()
+                    if text:
+                        lines.append(text)
+                    elem.clear()
+                elif elem.tag == _ODF_ROW and cell_depth == 0:
+                    cells = ["".join(c.itertext()).strip() for c in elem if c.tag == _ODF_CELL]
+                    cells = [c for c in cells if c]
+                    if cells and rows < row_limit:
+                        lines.append(" | ".join(cells))
+                        rows += 1
+                    elem.clear()
+    except Exception as e:
+        print(f"⚠️ ODF read failed for {file_path}: {e}")
+    return clean_extracted_text("\n".join(lines))
+
+
+_RTF_TOKEN_RE = re.compile(r"\\([a-z]{1,32})(-?\d{1,10})? ?|\\'([0-9a-f]{2})|\\([^a-z])|([{}])|[\r\n]+|(.)", re.IGNORECASE)
+_RTF_DESTINATIONS = {
+    "fonttbl", "colortbl", "stylesheet", "info", "pict", "header", "footer", "headerl", "headerr",
+    "footerl", "footerr", "listtable", "listoverridetable", "rsidtbl", "generator", "xmlnstbl",
+    "themedata", "colorschememapping", "datastore", "latentstyles", "object", "objdata",
+    # a field keeps its \fldrslt text (what the reader sees), not the \fldinst code
+    "fldinst",
+}
+_RTF_BREAKS = {"par": "\n", "line": "\n", "row": "\n", "sect": "\n", "page": "\n", "tab": " ", "cell": " | "}
+# \'xx bytes are in the codepage of the current font's \fcharset, else the document's \ansicpg
+_RTF_FONT_CHARSET_RE = re.compile(r"\\f(\d+)[^{}]*?\\fcharset(\d+)")
+_RTF_CHARSET_CODEPAGES = {
+    77: "mac_roman", 128: "cp932", 129: "cp949", 134: "gbk", 136: "cp950", 161: "cp1253", 162: "cp1254",
+    163: "cp1258", 177: "cp1255", 178: "cp1256", 186: "cp1257", 204: "cp1251", 222: "cp874", 238: "cp1250",
+}
+
+
+def _rtf_codec(codepage):
+    """Python codec for an \\ansicpg number, cp1252 when unknown."""
+    try:
+        return codecs.lookup(f"cp{codepage}").name
+    except LookupError:
+        return "cp1252"
+
+
+@register_extractor((".rtf",), (RTF_MIME,))
+def extract_text_from_rtf(file_path, **options):
+    """Single pass over the RTF tokens, skipping non-text destinations."""
+    try:
+        with open(file_path, encoding="cp1252", errors="ignore") as f:
+            data = f.read()
+    except OSError:
+        return ""
+    # Fonts with a non-ANSI charset, e.g. {\f1\fnil\fcharset178 Arial;} for Arabic
+    font_codecs = {int(font): _RTF_CHARSET_CODEPAGES[int(charset)]
+                   for font, charset in _RTF_FONT_CHARSET_RE.findall(data)
+                   if int(charset) in _RTF_CHARSET_CODEPAGES}
+    ansi = "cp1252"
+    out = []
+    stack = []
+    ignorable = False
+    uc_skip = 1
+    skip = 0
+    font = None
+    pending = bytearray()  # consecutive \'xx bytes, decoded together (double-byte codepages)
+
+    def flush():
+        if pending:
+            out.append(bytes(pending).decode(font_codecs.get(font, ansi), errors="ignore"))
+            pending.clear()
+
+    for m in _RTF_TOKEN_RE.finditer(data):
+        word, arg, hexcode, char, brace, plain = m.groups()
+        if hexcode is None:
+            flush()
+        if brace == "{":
+            stack.append((ignorable, uc_skip, font))
+            skip = 0
+        elif brace == "}":
+            if stack:
+                ignorable, uc_skip, font = stack.pop()
+            skip = 0
+        elif char is not None:
+            if char == "*":
+                ignorable = True
+            elif not ignorable and char in "{}\\":
+                out.append(char)
+            elif not ignorable and char == "~":
+                out.append(" ")
+        elif word is not None:
+            word = word.lower()
+            if word in _RTF_DESTINATIONS:
+                ignorable = True
+            elif ignorable:
+                pass
+            elif word in _RTF_BREAKS:
+                out.append(_RTF_BREAKS[word])
+            elif word == "ansicpg" and arg:
+                ansi = _rtf_codec(arg)
+            elif word in ("f", "deff") and arg:
+                font = int(arg)
+            elif word == "uc":
+                uc_skip = int(arg or 1)
+            elif word == "u":
+                code = int(arg or 0)
+                out.append(chr(code + 0x10000 if code < 0 else code))
+                skip = uc_skip
+        elif hexcode is not None:
+            if skip:
+                skip -= 1
+            elif not ignorable:
+                pending.append(int(hexcode, 16))
+        elif plain is not None:
+            if skip:
+                skip -= 1
+            elif not ignorable:
+                out.append(plain)
+    flush()
+    return clean_extracted_text("".join(out))
@@ -0,0 +1,277 @@
+"""
+Fast local pre-extraction of the structured DCE fields that n8n/Ollama
+otherwise has to find in merged_text: estimation, caution provisoire,
+séance d'ouverture des plis, qualification requirements and lot list.
+
+Every field comes back with a confidence score so n8n can skip the LLM
+when everything was found with high confidence, or send it a much
+shorter prompt for what is still missing.
+
+The heuristics are line based: they rely on clean_extracted_text keeping
+the line breaks of the extracted documents.
+
+    python field_extraction.py   # runs the regression cases below
+"""
+import re
+import unicodedata
+
+# Confidence levels, from strongest to weakest evidence
+CONF_INLINE = 0.9     # label and value on the same line, with unit / date format
+CONF_LAYOUT = 0.75    # label alone in its block, value in the following block
+CONF_WEAK = 0.5       # value found near the label but without a unit
+
+COMPLETE_MIN_CONFIDENCE = CONF_LAYOUT
+SCALAR_FIELDS = ("estimation", "caution_provisoire", "seance_ouverture")
+
+# How far (in characters) after a label we look for its value, never past the end of its line
+VALUE_WINDOW = 250
+
+# -----------------------------
+# PRECOMPILED PATTERNS
+# -----------------------------
+_AMOUNT = r"(\d{1,3}(?:[ .]\d{3})+(?:[.,]\d{1,2})?|\d+(?:[.,]\d{1,2})?)"
+_CURRENCY = r"(?:dhs?|mad|dirhams?|درهم|دراهم)"
+
+AMOUNT_WITH_CURRENCY_RE = re.compile(_AMOUNT + r"\s*(?:\(?\s*)?" + _CURRENCY + r"(?:\s*(?:ttc|ht))?", re.IGNORECASE)
+AMOUNT_RE = re.compile(_AMOUNT)
+
+ESTIMATION_LABEL_RE = re.compile(
+    r"(estimation|co[uû]t\s+estimatif|montant\s+estimatif|budget\s+pr[ée]visionnel"
+    r"|تقدير\s+(?:كلفة|الكلفة|تكلفة)|الكلفة\s+التقديرية|التكلفة\s+التقديرية)",
+    re.IGNORECASE,
+)
+CAUTION_LABEL_RE = re.compile(
+    r"(caution(?:nement)?\s+provisoire|garantie\s+provisoire|الضمان\s+المؤقت|الكفالة\s+المؤقتة)",
+    re.IGNORECASE,
+)
+CAUTION_NONE_RE = re.compile(r"\b(n[ée]ant|non\s+exig[ée]e?|pas\s+de\s+caution|sans\s+objet)\b|لا\s+يطلب", re.IGNORECASE)
+OUVERTURE_LABEL_RE = re.compile(
+    r"(s[ée]ance\s+(?:publique\s+)?d.\s*ouverture|ouverture\s+des\s+plis|فتح\s+(?:الأظرفة|الاظرفة|الأظرفة)|جلسة\s+فتح)",
+    re.IGNORECASE,
+)
+QUALIFICATION_LABEL_RE = re.compile(
+    r"(qualification|classification|agr[ée]ment|certificat\s+de\s+qualification|التأهيل|التصنيف|شهادة\s+التأهيل)",
+    re.IGNORECASE,
+)
+LOT_RE = re.compile(
+    r"^\s*(?:lot\s*(?:n\s*[°ºo]\.?\s*)?(\d+|unique)|الحصة\s*(?:رقم)?\s*(\d+))\s*[:\-–.]?\s*(.*)$",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+DATE_RE = re.compile(r"(\d{1,2})\s*[/.\-]\s*(\d{1,2})\s*[/.\-]\s*(\d{2,4})")
+TIME_RE = re.compile(r"(\d{1,2})\s*(?:h|:|heures?)\s*(\d{2})?", re.IGNORECASE)
+
+# A label line is "label", optionally followed by ":" and nothing else
+_LABEL_ONLY_TAIL_RE = re.compile(r"^[\s:\-–.]*$")
+# A value window stops where the next field starts
+_ANY_LABEL_RE = re.compile(
+    "|".join(r.pattern for r in (ESTIMATION_LABEL_RE, CAUTION_LABEL_RE, OUVERTURE_LABEL_RE)), re.IGNORECASE
+)
+
+
+# -----------------------------
+# HELPERS
+# -----------------------------
+def parse_amount(raw):
+    """Turns '1 234 567,89' / '1.234.567,89' / '1234567.89' into a float."""
+    raw = raw.strip().replace(" ", "")
+    if "," in raw and "." in raw:
+        raw = raw.replace(".", "").replace(",", ".")
+    elif "," in raw:
+        raw = raw.replace(",", ".")
+    elif raw.count(".") > 1 or re.search(r"\.\d{3}$", raw):
+        raw = raw.replace(".", "")
+    try:
+        return float(raw)
+    except ValueError:
+        return None
+
+
+def parse_date(snippet):
+    """Returns 'YYYY-MM-DD' or 'YYYY-MM-DDTHH:MM' from the first date in snippet."""
+    m = DATE_RE.search(snippet)
+    if not m:
+        return None
+    day, month, year = (int(g) for g in m.groups())
+    if year < 100:
+        year += 2000
+    if not (1 <= day <= 31 and 1 <= month <= 12):
+        return None
+    value = f"{year:04d}-{month:02d}-{day:02d}"
+    t = TIME_RE.search(snippet, m.end())
+    if t and t.start() - m.end() < 40:
+        hour, minute = int(t.group(1)), int(t.group(2) or 0)
+        if hour < 24 and minute < 60:
+            value += f"T{hour:02d}:{minute:02d}"
+    return value
+
+
+def _field(value, text, confidence):
+    return {"value": value, "text": text.strip(), "confidence": confidence}
+
+
+def _best(candidates):
+    candidates = [c for c in candidates if c]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda c: c["confidence"])
+
+
+def _until_next_label(window):
+    m = _ANY_LABEL_RE.search(window)
+    return window[:m.start()] if m else window
+
+
+def _label_windows(label_re, text):
+    """
+    Yields (window, is_layout) for every label occurrence: the rest of the
+    label's line, or, when the label sits alone on its line (a label block
+    followed by a value block, as PyMuPDF emits table cells), the next line.
+    A window never runs into the next field, so a label without a value
+    cannot pick up its neighbour's.
+    """
+    for m in label_re.finditer(text):
+        line_end = text.find("\n", m.end())
+        if line_end == -1:
+            line_end = len(text)
+        tail = text[m.end():line_end]
+        if _LABEL_ONLY_TAIL_RE.match(tail) or len(tail.strip(" :-–.")) < 3:
+            if line_end == len(text):
+                continue
+            next_end = text.find("\n", line_end + 1)
+            if next_end == -1:
+                next_end = len(text)
+            yield _until_next_label(text[line_end + 1:next_end][:VALUE_WINDOW]), True
+        else:
+            yield _until_next_label(tail[:VALUE_WINDOW]), False
+
+
+# -----------------------------
+# FIELD EXTRACTORS
+# -----------------------------
+def _amount_in(window, is_layout):
+    m = AMOUNT_WITH_CURRENCY_RE.search(window)
+    if m:
+        value = parse_amount(m.group(1))
+        if value:
+            return _field(value, m.group(0), CONF_LAYOUT if is_layout else CONF_INLINE)
+        return None
+    m = AMOUNT_RE.search(window)
+    if m and not DATE_RE.match(window, m.start()):
+        value = parse_amount(m.group(1))
+        if value and value >= 100:
+            return _field(value, m.group(0), CONF_WEAK)
+    return None
+
+
+def _extract_amount(label_re, text):
+    return _best(_amount_in(window, is_layout) for window, is_layout in _label_windows(label_re, text))
+
+
+def extract_caution(text):
+    candidates = []
+    for window, is_layout in _label_windows(CAUTION_LABEL_RE, text):
+        # "Néant" wins over whatever number follows it on the line
+        none = CAUTION_NONE_RE.search(window)
+        amount = AMOUNT_RE.search(window)
+        if none and (not amount or none.start() < amount.start()):
+            candidates.append(_field(0.0, none.group(0), CONF_LAYOUT))
+        else:
+            candidates.append(_amount_in(window, is_layout))
+    return _best(candidates)
+
+
+def extract_seance_ouverture(text):
+    candidates = []
+    for window, is_layout in _label_windows(OUVERTURE_LABEL_RE, text):
+        value = parse_date(window)
+        if value:
+            confidence = CONF_INLINE if "T" in value else CONF_LAYOUT
+            if is_layout:
+                confidence = min(confidence, CONF_LAYOUT)
+            candidates.append(_field(value, window[:80], confidence))
+    return _best(candidates)
+
+
+def extract_qualification(lines):
+    for i, line in enumerate(lines):
+        m = QUALIFICATION_LABEL_RE.search(line)
+        if not m:
+            continue
+        tail = line[m.end():].strip(" :-–.")
+        if len(tail) >= 10:
+            return _field(tail, line, CONF_INLINE)
+        if i + 1 < len(lines) and len(lines[i + 1]) >= 10:
+            return _field(lines[i + 1].strip(), lines[i + 1], CONF_LAYOUT)
+    return None
+
+
+def extract_lots(text):
+    lots = {}
+    for m in LOT_RE.finditer(text):
+        numero = (m.group(1) or m.group(2) or "").lower()
+        objet = m.group(3).strip()
+        if numero and numero not in lots:
+            lots[numero] = objet
+    if not lots:
+        return None
+    value = [{"numero": n, "objet": o} for n, o in lots.items()]
+    confidence = CONF_INLINE if all(o for o in lots.values()) else CONF_LAYOUT
+    return {"value": value, "text": "", "confidence": confidence}
+
+
+def extract_tender_fields(text):
+    """
+    Returns {field: {"value", "text", "confidence"} or None} for every
+    structured field we know how to find in the DCE text.
+    """
+    text = unicodedata.normalize("NFKC", text or "")
+    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
+    return {
+        "estimation": _extract_amount(ESTIMATION_LABEL_RE, text),
+        "caution_provisoire": extract_caution(text),
+        "seance_ouverture": extract_seance_ouverture(text),
+        "qualification": extract_qualification(lines),
+        "lots": extract_lots(text),
+    }
+
+
+def fields_complete(fields, min_confidence=COMPLETE_MIN_CONFIDENCE):
+    """True when every scalar field was found with enough confidence for n8n to skip the LLM."""
+    return all(
+        fields.get(name) and fields[name]["confidence"] >= min_confidence
+        for name in SCALAR_FIELDS
+    )
+
+
+# -----------------------------
+# REGRESSION CASES
+# -----------------------------
+# (text, field, expected value, minimum confidence or None when the field must be missing)
+REGRESSION_CASES = [
+    ("Caution provisoire : Néant\nEstimation : 300 000 DH TTC", "caution_provisoire", 0.0, CONF_LAYOUT),
+    ("Caution provisoire : Néant\nEstimation : 300 000 DH TTC", "estimation", 300000.0, CONF_INLINE),
+    ("Estimation : voir annexe\nCaution provisoire : 5 000,00 DH", "estimation", None, None),
+    ("Estimation : voir annexe\nCaution provisoire : 5 000,00 DH", "caution_provisoire", 5000.0, CONF_INLINE),
+    ("Caution provisoire : néant. Date limite 2025", "caution_provisoire", 0.0, CONF_LAYOUT),
+    ("Caution provisoire :\n10 000 DH", "caution_provisoire", 10000.0, CONF_LAYOUT),
+    ("Caution provisoire : Estimation : 450 000 DH", "caution_provisoire", None, None),
+    ("Séance d'ouverture des plis : 12/05/2025 à 10h00", "seance_ouverture", "2025-05-12T10:00", CONF_INLINE),
+]
+
+
+def _check_regressions():
+    failures = 0
+    for text, name, expected, min_confidence in REGRESSION_CASES:
+        found = extract_tender_fields(text)[name]
+        value = found["value"] if found else None
+        ok = value == expected and (found is None or found["confidence"] >= min_confidence)
+        if not ok:
+            failures += 1
+            print(f"❌ {name} in {text!r}: got {found}, expected {expected}")
+    print(f"{len(REGRESSION_CASES) - failures}/{len(REGRESSION_CASES)} regression cases pass")
+    return failures
+
+
+if __name__ == "__main__":
+    raise SystemExit(1 if _check_regressions() else 0)
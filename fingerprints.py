@@ -0,0 +1,139 @@
+"""
+Change detection for tenders seen again, in an overlapping window or after
+an amendment.
+
+Three levels of fingerprints are kept in SQLite:
+  - listing: objet, acheteur, lieux and deadline of the search result row;
+             a processed tender whose listing changed is queued again
+  - page:    key fields of the detail page and the DCE link (name / size);
+             when unchanged, the download is skipped and the stored text reused
+  - members: CRC-32 and size of every archive member, read from the ZIP
+             central directory; only new or changed members are extracted
+"""
+import os
+import json
+import zlib
+import sqlite3
+import hashlib
+import zipfile
+from datetime import datetime
+
+from selenium.webdriver.common.by import By
+
+from dedup import STATE_DIR
+
+DEFAULT_FINGERPRINT_PATH = os.getenv("FINGERPRINT_DB_PATH", os.path.join(STATE_DIR, "tender_fingerprints.db"))
+
+LISTING_FIELDS = ("objet", "acheteur", "lieux_execution", "date_limite")
+# Suffixes of the consultation summary ids on the Atexo detail page
+DETAIL_FIELDS = ("reference", "objet", "dateHeureLimiteRemisePlis", "lieuxExecutions", "categoriePrincipale", "procedureType")
+DCE_LINK_ID = "ctl0_CONTENU_PAGE_linkDownloadDce"
+
+
+def fingerprint(values):
+    return hashlib.sha1(json.dumps(values, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def listing_fingerprint(row):
+    return fingerprint([(row.get(name) or "").strip() for name in LISTING_FIELDS])
+
+
+def page_fingerprint(driver):
+    """
+    Fingerprint of the opened detail page, or None when none of its key
+    fields can be found (the tender is then always downloaded).
+    """
+    values = {}
+    for name in DETAIL_FIELDS:
+        elements = driver.find_elements(By.XPATH, f'//*[contains(@id, "ConsultationSummary_{name}")]')
+        if elements:
+            values[name] = " ".join(elements[0].text.split())
+    if not values:
+        return None
+    # The DCE block shows the archive name and size when the portal provides them
+    links = driver.find_elements(By.ID, DCE_LINK_ID)
+    if links:
+        block = links[0].find_element(By.XPATH, "./..")
+        values["dce"] = " ".join(block.text.split())
+        values["dce_href"] = links[0].get_attribute("href") or ""
+    return fingerprint(values)
+
+
+def archive_members(path):
+    """
+    {name: (crc, size)} of the downloaded file. For a ZIP this only reads the
+    central directory; any other file is a single member hashed as a whole.
+    """
+    if path.lower().endswith(".zip"):
+        with zipfile.ZipFile(path) as archive:
+            return {info.filename: (info.CRC, info.file_size) for info in archive.infolist() if not info.is_dir()}
+    crc = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            crc = zlib.crc32(chunk, crc)
+    return {os.path.basename(path): (crc, os.path.getsize(path))}
+
+
+class FingerprintStore:
+    def __init__(self, db_path=DEFAULT_FINGERPRINT_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=30)  # portals write from their own threads
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS tenders (
+                portal TEXT NOT NULL,
+                reference TEXT NOT NULL,
+                page_fingerprint TEXT,
+                archive_name TEXT,
+                archive_size INTEGER,
+                updated_at TEXT NOT NULL,
+                PRIMARY KEY (portal, reference)
+            );
+            CREATE TABLE IF NOT EXISTS members (
+                portal TEXT NOT NULL,
+                reference TEXT NOT NULL,
+                name TEXT NOT NULL,
+                crc INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                text TEXT,
+                PRIMARY KEY (portal, reference, name)
+            );
+        """)
+
+    def page(self, portal, reference):
+        """Stored page fingerprint, or None for a tender never extracted."""
+        row = self.conn.execute(
+            "SELECT page_fingerprint FROM tenders WHERE portal = ? AND reference = ?", (portal, reference)
+        ).fetchone()
+        return row[0] if row else None
+
+    def members(self, portal, reference):
+        """{name: (crc, size, text)} as stored; text is None for skipped members."""
+        rows = self.conn.execute(
+            "SELECT name, crc, size, text FROM members WHERE portal = ? AND reference = ? ORDER BY rowid",
+            (portal, reference),
+        )
+        return {name: (crc, size, text) for name, crc, size, text in rows}
+
+    def save(self, portal, reference, page_fp, archive_path, members):
+        """Replaces the tender's fingerprints. members is {name: (crc, size, text)}."""
+        archive_name = os.path.basename(archive_path) if archive_path else None
+        archive_size = os.path.getsize(archive_path) if archive_path and os.path.exists(archive_path) else None
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO tenders VALUES (?, ?, ?, ?, ?, ?)",
+                (portal, reference, page_fp, archive_name, archive_size, datetime.now().isoformat()),
+            )
+            self.conn.execute("DELETE FROM members WHERE portal = ? AND reference = ?", (portal, reference))
+            self.conn.executemany(
+                "INSERT INTO members VALUES (?, ?, ?, ?, ?, ?)",
+                [(portal, reference, name, crc, size, text) for name, (crc, size, text) in members.items()],
+            )
+
+    def close(self):
+        self.conn.close()
+
+
+def changed_members(current, stored):
+    """Names in current whose CRC or size differs from the stored member."""
+    return [name for name, (crc, size) in current.items()
+            if name not in stored or stored[name][:2] != (crc, size)]
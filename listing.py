@@ -0,0 +1,252 @@
+"""
+Advanced-search listing of the Atexo portals, for the daily run and for
+date-range backfills.
+
+A backfill splits [start, end] into windows of BACKFILL_WINDOW_DAYS,
+searches them in parallel on the run's BrowserPool and merges the rows by
+reference. A window that fills the whole result page (PAGE_SIZE rows) may
+be truncated, so it is split in two and searched again. A window that
+still fails after BACKFILL_ATTEMPTS is reported with BackfillIncomplete,
+which carries the tenders of the other windows and the ranges to rerun.
+
+Every search applies the portal's SearchProfile (search_profile.py) to the
+form first, so category, keyword, procedure, buyer and region filtering
+happen server-side. A profile field whose form element is missing is
+skipped with a warning rather than failing the search.
+"""
+import os
+import time
+import random
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import Select, WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import NoSuchElementException, TimeoutException
+
+from tender import Tender
+from resilience import retry
+from search_profile import CATEGORY_CHECKBOXES
+
+PAGE_SIZE = 500
+DATE_FORMAT = "%d/%m/%Y"
+
+BACKFILL_START = os.getenv("BACKFILL_START", "")
+BACKFILL_END = os.getenv("BACKFILL_END", "")
+BACKFILL_WINDOW_DAYS = int(os.getenv("BACKFILL_WINDOW_DAYS", "3"))
+BACKFILL_WORKERS = int(os.getenv("BACKFILL_WORKERS", "3"))
+BACKFILL_ATTEMPTS = int(os.getenv("BACKFILL_ATTEMPTS", "3"))
+
+
+class BackfillIncomplete(Exception):
+    """Some windows could not be searched; tenders holds what the others listed."""
+
+    def __init__(self, tenders, missing):
+        self.tenders = tenders
+        self.missing = missing  # [(start, end, keyword)]
+        ranges = ", ".join(f"{s.strftime(DATE_FORMAT)} → {e.strftime(DATE_FORMAT)}" + (f" [{k}]" if k else "")
+                           for s, e, k in missing)
+        super().__init__(f"{len(missing)} backfill windows failed: {ranges}")
+
+
+def parse_date(value):
+    """Accepts dd/mm/yyyy or yyyy-mm-dd."""
+    for fmt in (DATE_FORMAT, "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value.strip(), fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognized date: {value!r} (expected dd/mm/yyyy or yyyy-mm-dd)")
+
+
+def _type_slowly(element, text):
+    element.clear()
+    for char in text:
+        element.send_keys(char)
+        time.sleep(random.uniform(0.05, 0.15))
+
+
+def _popup(driver, wait, link_id):
+    """Opens a "Définir" popup of the search form and switches to it."""
+    wait.until(EC.element_to_be_clickable((By.ID, link_id))).click()
+    wait.until(lambda d: len(d.window_handles) > 1)
+    driver.switch_to.window(driver.window_handles[-1])
+
+
+def _validate_popup(driver, wait, fields):
+    wait.until(EC.element_to_be_clickable((By.ID, fields["popup_validate"]))).click()
+    driver.switch_to.window(driver.window_handles[0])
+
+
+def select_categories(driver, wait, profile):
+    _popup(driver, wait, profile.fields["categories_link"])
+    for category in profile.categories:
+        checkbox = wait.until(EC.element_to_be_clickable((By.ID, CATEGORY_CHECKBOXES[category])))
+        if not checkbox.is_selected():
+            checkbox.click()
+    _validate_popup(driver, wait, profile.fields)
+    print(f"✅ Categories selected: {', '.join(profile.categories)}")
+
+
+def select_region(driver, wait, profile):
+    _popup(driver, wait, profile.fields["region_link"])
+    label = wait.until(EC.presence_of_element_located(
+        (By.XPATH, f'//label[contains(normalize-space(.), "{profile.region}")]')))
+    checkbox = driver.find_element(By.ID, label.get_attribute("for"))
+    if not checkbox.is_selected():
+        checkbox.click()
+    _validate_popup(driver, wait, profile.fields)
+    print(f"✅ Region selected: {profile.region}")
+
+
+def apply_profile(driver, wait, profile, keyword=None):
+    """Fills the AdvancedSearch form from the profile, best effort field by field."""
+    steps = []
+    if profile.categories:
+        steps.append(("categories", lambda: select_categories(driver, wait, profile)))
+    if keyword:
+        steps.append(("keywords", lambda: _type_slowly(driver.find_element(By.ID, profile.fields["keywords"]), keyword)))
+    if profile.procedure:
+        steps.append(("procedure", lambda: Select(driver.find_element(By.ID, profile.fields["procedure"]))
+                      .select_by_visible_text(profile.procedure)))
+    if profile.buyer:
+        steps.append(("buyer", lambda: Select(driver.find_element(By.ID, profile.fields["buyer"]))
+                      .select_by_visible_text(profile.buyer)))
+    if profile.region:
+        steps.append(("region", lambda: select_region(driver, wait, profile)))
+
+    for name, step in steps:
+        try:
+            step()
+        except (NoSuchElementException, TimeoutException) as e:
+            print(f"⚠️ Search profile {profile.portal}: could not apply {name} ({type(e).__name__}), skipped.")
+            if len(driver.window_handles) > 1:
+                driver.switch_to.window(driver.window_handles[-1])
+                driver.close()
+            driver.switch_to.window(driver.window_handles[0])
+
+
+def scrape_result_rows(driver):
+    rows = driver.find_elements(By.XPATH, '//table[@class="table-results"]/tbody/tr')
+    tenders = []
+    for row in rows:
+        try:
+            ref = row.find_element(By.CSS_SELECTOR, '.col-450 .ref').text
+            objet = row.find_element(By.XPATH, './/div[contains(@id,"panelBlocObjet")]').text.replace("Objet : ", "")
+            buyer = row.find_element(By.XPATH, './/div[contains(@id,"panelBlocDenomination")]').text.replace("Acheteur public : ", "")
+            lieux = row.find_element(By.XPATH, './/div[contains(@id,"panelBlocLieuxExec")]').text.replace("\n", ", ")
+            deadline = row.find_element(By.XPATH, './/td[@headers="cons_dateEnd"]').text.replace("\n", " ")
+            first_button = row.find_element(By.XPATH, './/td[@class="actions"]//a[1]').get_attribute("href")
+            tenders.append(Tender(ref, objet, buyer, lieux, deadline, first_button))
+        except Exception as e:
+            print(f"⚠️ Error extracting row: {e}")
+    return tenders
+
+
+def run_search(driver, search_url, start_date, end_date=None, profile=None, keyword=None):
+    """Runs one advanced search on the publication date range and returns the listed tenders."""
+    wait = WebDriverWait(driver, 25)
+    driver.get(search_url)
+    time.sleep(2)
+
+    if profile is not None:
+        apply_profile(driver, wait, profile, keyword)
+
+    # Publication date filter
+    _type_slowly(driver.find_element(By.ID, "ctl0_CONTENU_PAGE_AdvancedSearch_dateMiseEnLigneCalculeStart"),
+                 start_date.strftime(DATE_FORMAT))
+    if end_date is not None:
+        _type_slowly(driver.find_element(By.ID, "ctl0_CONTENU_PAGE_AdvancedSearch_dateMiseEnLigneCalculeEnd"),
+                     end_date.strftime(DATE_FORMAT))
+    search_button = driver.find_element(By.ID, "ctl0_CONTENU_PAGE_AdvancedSearch_lancerRecherche")
+    driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", search_button)
+    time.sleep(0.8)
+    search_button.click()
+    time.sleep(2)
+
+    # Results per page
+    wait.until(EC.presence_of_element_located((By.ID, "ctl0_CONTENU_PAGE_resultSearch_listePageSizeTop")))
+    Select(driver.find_element(By.ID, "ctl0_CONTENU_PAGE_resultSearch_listePageSizeTop")).select_by_value(str(PAGE_SIZE))
+    time.sleep(2)
+
+    return scrape_result_rows(driver)
+
+
+def _merge(results):
+    merged = {}
+    for tenders in results:
+        for tender in tenders:
+            merged.setdefault(tender.reference, tender)
+    return list(merged.values())
+
+
+def run_profile_search(driver, search_url, start_date, end_date=None, profile=None):
+    """One search per profile keyword (the portal has no OR), merged by reference."""
+    keywords = (profile.keywords if profile is not None else None) or [None]
+    results = []
+    for keyword in keywords:
+        tenders = run_search(driver, search_url, start_date, end_date, profile, keyword)
+        if keyword:
+            print(f"🔎 Keyword {keyword!r}: {len(tenders)} tenders")
+        results.append(tenders)
+    return _merge(results)
+
+
+def date_windows(start, end, days=BACKFILL_WINDOW_DAYS):
+    windows = []
+    current = start
+    while current <= end:
+        window_end = min(end, current + timedelta(days=days - 1))
+        windows.append((current, window_end))
+        current = window_end + timedelta(days=1)
+    return windows
+
+
+def search_window(driver, search_url, start, end, profile=None, keyword=None):
+    """Searches one window, splitting it while the result page is full."""
+    tenders = run_search(driver, search_url, start, end, profile, keyword)
+    label = f"{start.strftime(DATE_FORMAT)} → {end.strftime(DATE_FORMAT)}"
+    if keyword:
+        label += f" [{keyword}]"
+    if len(tenders) < PAGE_SIZE:
+        print(f"📅 {label}: {len(tenders)} tenders")
+        return tenders
+    if start == end:
+        print(f"⚠️ {label}: result page full ({len(tenders)} rows), some tenders may be missing.")
+        return tenders
+    middle = start + (end - start) // 2
+    print(f"✂️ {label}: result page full, splitting the window.")
+    return (search_window(driver, search_url, start, middle, profile, keyword)
+            + search_window(driver, search_url, middle + timedelta(days=1), end, profile, keyword))
+
+
+def backfill(search_url, start, end, browsers, window_days=BACKFILL_WINDOW_DAYS,
+             workers=BACKFILL_WORKERS, profile=None):
+    """Lists every tender published between start and end, deduplicated by reference."""
+    keywords = (profile.keywords if profile is not None else None) or [None]
+    windows = [(s, e, k) for s, e in date_windows(start, end, window_days) for k in keywords]
+    print(f"🗓️ Backfill {start} → {end}: {len(windows)} searches on {workers} browser sessions")
+
+    def attempt(window):
+        with browsers.session() as driver:
+            return search_window(driver, search_url, window[0], window[1], profile, window[2])
+
+    def search(window):
+        try:
+            return retry(lambda: attempt(window), attempts=BACKFILL_ATTEMPTS,
+                         label=f"Backfill window {window[0]} → {window[1]}")
+        except Exception as e:
+            print(f"⚠️ Backfill window {window[0]} → {window[1]} failed: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        results = list(pool.map(search, windows))
+
+    merged = _merge(r for r in results if r is not None)
+    missing = [window for window, r in zip(windows, results) if r is None]
+    if missing:
+        print(f"❌ Backfill listed {len(merged)} unique tenders, {len(missing)} windows missing.")
+        raise BackfillIncomplete(merged, missing)
+    print(f"✅ Backfill listed {len(merged)} unique tenders.")
+    return merged
@@ -2,17 +2,11 @@ import os
 import time
 import shutil
 import zipfile
-import subprocess
-import unicodedata
 import requests
 from datetime import datetime
-import re
 
-# PDF / OCR / DOC
-import fitz  # PyMuPDF
-from pdf2image import convert_from_path
-import pytesseract
-import docx
+# PDF / OCR / DOC / XLSX / ODT / RTF
+from sandbox import ExtractionPool, safe_extract
 
 # Selenium
 from selenium import webdriver
@@ -60,55 +54,13 @@ print("✅ WebDriver initialized.")
 PDF_PAGE_LIMIT = 15 
 
 # -----------------------------
-# TEXT EXTRACTION HELPER FUNCTIONS
+# HELPER FUNCTIONS
 # -----------------------------
-def clean_extracted_text(text):
-    text = unicodedata.normalize("NFKC", text)
-    text = re.sub(r"\n{2,}", "\n", text)
-    text = re.sub(r"[ \t]+", " ", text)
-    cleaned_lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
-    return "\n".join(cleaned_lines).strip()
-
-def extract_text_from_pdf(file_path):
-    text = ""
-    try:
-        doc = fitz.open(file_path)
-        limit = min(len(doc), PDF_PAGE_LIMIT)
-        for i in range(limit):
-            text += doc[i].get_text("text") + "\n"
-        doc.close()
-    except Exception:
-        text = ""
-    
-    if len(text.strip()) < 50:
-        try:
-            pages = convert_from_path(file_path, last_page=PDF_PAGE_LIMIT)
-            for page_image in pages:
-                text += pytesseract.image_to_string(page_image, lang="fra+ara+eng") + "\n"
-        except Exception:
-            pass
-    return clean_extracted_text(text)
-
-def extract_text_from_docx(file_path):
-    try:
-        doc = docx.Document(file_path)
-        return clean_extracted_text("\n".join(p.text for p in doc.paragraphs if p.text.strip()))
-    except Exception:
-        return ""
-
-def extract_text_from_doc(file_path):
-    try:
-        process = subprocess.Popen(["antiword", file_path], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        stdout, _ = process.communicate()
-        return clean_extracted_text(stdout.decode("utf-8", errors="ignore"))
-    except Exception:
-        return ""
-
 def extract_zip(zip_path, extract_to_folder):
     try:
         with zipfile.ZipFile(zip_path, "r") as zip_ref:
-            zip_ref.extractall(extract_to_folder)
-        return True
+            names = zip_ref.namelist()
+        return bool(safe_extract(zip_path, names, extract_to_folder))
     except Exception as e:
         print(f"⚠️ Failed to unzip: {e}")
         return False
@@ -189,17 +141,15 @@ try:
 
         # B. Extract Text
         extracted_texts = []
+        # This script has no __main__ guard and runs single-threaded: fork is safe, a fresh interpreter is not
+        extraction_pool = ExtractionPool(start_method="fork")
+        try:
+            results = extraction_pool.extract_many(file_list_to_read_text, page_limit=PDF_PAGE_LIMIT)
+        finally:
+            extraction_pool.close()
         for fpath in file_list_to_read_text:
             fname = os.path.basename(fpath)
-            ext = os.path.splitext(fname)[1].lower()
-            text_chunk = ""
-            
-            if ext == ".pdf":
-                text_chunk = extract_text_from_pdf(fpath)
-            elif ext == ".docx":
-                text_chunk = extract_text_from_docx(fpath)
-            elif ext == ".doc":
-                text_chunk = extract_text_from_doc(fpath)
+            text_chunk = results[fpath].text or ""
             
             if text_chunk:
                 extracted_texts.append(f"--- START FILE: {fname} ---\n{text_chunk}\n--- END FILE ---\n")
@@ -0,0 +1,141 @@
+"""
+Script-aware OCR: pick the smallest Tesseract language set for each page
+instead of always running "fra+ara+eng".
+
+A cheap OSD pass on a downscaled copy of the page tells whether it is
+Latin or Arabic script. Pages where OSD is unsure keep the full language
+set so no Arabic content is lost.
+
+OSD only reports the dominant script, and Moroccan DCEs are often bilingual
+(Arabic letterhead over a French body). A Latin page is read with "fra"
+alone, and that pass doubles as the Arabic probe: Arabic glyphs come out of
+the French model as words with very low confidence, and when there are
+enough of them the page is read again with "fra+ara". French-only pages,
+the bulk of a DCE, thus cost OSD plus one single-language pass. The pages
+of one document share a small state: once a page held Arabic, its next
+Latin pages are read with "fra+ara" straight away.
+
+    python ocr.py dce.pdf   # per-page timings against a plain "fra+ara+eng" pass
+
+Pages are rasterized in-process from the already open fitz.Document into
+grayscale pixmaps, so no poppler / pdftoppm subprocess is involved.
+"""
+import re
+import sys
+import time
+
+import fitz  # PyMuPDF
+import pytesseract
+from pytesseract import Output
+from PIL import Image
+
+FULL_LANGS = "fra+ara+eng"
+SCRIPT_LANGS = {
+    "Latin": "fra",
+    # Arabic pages often carry French names, references and amounts
+    "Arabic": "ara+fra",
+}
+LATIN_WITH_ARABIC = "fra+ara"
+# OSD script confidence below which we keep the full language set
+MIN_SCRIPT_CONF = 2.0
+OSD_MAX_SIDE = 1600
+# A Latin page is read again with "ara" once this many of its "fra" words fall below LOW_WORD_CONF
+LOW_WORD_CONF = 30
+ARABIC_SUSPECT_WORDS = 4
+OCR_DPI = 200  # same resolution pdf2image used by default
+
+_ARABIC_WORD_RE = re.compile(r"[\u0600-\u06ff]{2,}")
+
+
+def render_page(page, dpi=OCR_DPI):
+    """Rasterizes a fitz page to a grayscale PIL image sharing the pixmap buffer."""
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+    image = Image.frombuffer("L", (pix.width, pix.height), pix.samples_mv, "raw", "L", pix.stride, 1)
+    image._pixmap = pix  # the image reads the pixmap memory, keep it alive
+    return image
+
+
+def data_to_text(data):
+    """Page text from image_to_data output: words joined per line, a blank line between blocks."""
+    lines, words, current = [], [], None
+    for i, word in enumerate(data["text"]):
+        if not word.strip():
+            continue
+        key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        if words and key != current:
+            lines.append(" ".join(words))
+            if key[0] != current[0]:
+                lines.append("")
+            words = []
+        current = key
+        words.append(word)
+    if words:
+        lines.append(" ".join(words))
+    return "\n".join(lines)
+
+
+def suspects_arabic(data):
+    """True when the "fra" pass left enough unreadable words to hide Arabic text."""
+    low = sum(1 for word, conf in zip(data["text"], data["conf"])
+              if word.strip() and 0 <= float(conf) < LOW_WORD_CONF)
+    return low >= ARABIC_SUSPECT_WORDS
+
+
+def detect_languages(image):
+    """Returns the Tesseract language string to use for this page image."""
+    probe = image
+    if max(image.size) > OSD_MAX_SIDE:
+        probe = image.copy()
+        probe.thumbnail((OSD_MAX_SIDE, OSD_MAX_SIDE))
+    try:
+        osd = pytesseract.image_to_osd(probe, output_type=Output.DICT)
+    except Exception:
+        # Too little text for OSD, or OSD data not installed
+        return FULL_LANGS
+    if float(osd.get("script_conf", 0)) < MIN_SCRIPT_CONF:
+        return FULL_LANGS
+    return SCRIPT_LANGS.get(osd.get("script"), FULL_LANGS)
+
+
+def ocr_page(image, document=None):
+    """
+    Text of one page image. document is a dict shared by the pages of one
+    document; it remembers whether Arabic was found on an earlier page.
+    """
+    document = {} if document is None else document
+    lang = detect_languages(image)
+    if lang == SCRIPT_LANGS["Latin"]:
+        if not document.get("arabic"):
+            data = pytesseract.image_to_data(image, lang=lang, output_type=Output.DICT)
+            if not suspects_arabic(data):
+                return data_to_text(data)
+        lang = LATIN_WITH_ARABIC
+    text = pytesseract.image_to_string(image, lang=lang)
+    if _ARABIC_WORD_RE.search(text):
+        document["arabic"] = True
+    return text
+
+
+def _time_pages(path, page_limit=10):
+    """Seconds per page for the old single "fra+ara+eng" pass and for ocr_page."""
+    doc = fitz.open(path)
+    document = {}
+    totals = [0.0, 0.0]
+    for i in range(min(len(doc), page_limit)):
+        image = render_page(doc[i])
+        started = time.perf_counter()
+        pytesseract.image_to_string(image, lang=FULL_LANGS)
+        full = time.perf_counter() - started
+        started = time.perf_counter()
+        ocr_page(image, document)
+        picked = time.perf_counter() - started
+        totals[0] += full
+        totals[1] += picked
+        print(f"page {i + 1}: {FULL_LANGS} {full:.1f}s, per-page languages {picked:.1f}s")
+    doc.close()
+    print(f"total: {FULL_LANGS} {totals[0]:.1f}s, per-page languages {totals[1]:.1f}s")
+
+
+if __name__ == "__main__":
+    for pdf_path in sys.argv[1:]:
+        _time_pages(pdf_path)
@@ -0,0 +1,175 @@
+"""
+Lightweight local relevance classifier (multinomial Naive Bayes) over the
+listing row fields, trained from past n8n webhook outcomes.
+
+Modes (RELEVANCE_MODE):
+  - "off":     no scoring
+  - "shadow":  score every row and report what would have been skipped
+  - "enforce": skip DCE downloads scoring below RELEVANCE_THRESHOLD
+
+Training:
+    python relevance.py train
+reads the outcomes appended by the scrapers (one JSON object per line with
+objet / acheteur / lieux_execution / relevant) and writes the model JSON.
+"""
+import os
+import sys
+import json
+import math
+import argparse
+from collections import Counter
+
+from dedup import STATE_DIR, normalize_text
+
+OUTCOMES_PATH = os.getenv("RELEVANCE_OUTCOMES_PATH", os.path.join(STATE_DIR, "relevance_outcomes.jsonl"))
+MODEL_PATH = os.getenv("RELEVANCE_MODEL_PATH", os.path.join(STATE_DIR, "relevance_model.json"))
+RELEVANCE_MODE = os.getenv("RELEVANCE_MODE", "shadow").lower()
+RELEVANCE_THRESHOLD = float(os.getenv("RELEVANCE_THRESHOLD", "0.2"))
+
+MIN_TRAINING_EXAMPLES = 50
+FIELD_PREFIXES = {"objet": "o", "acheteur": "a", "lieux_execution": "l"}
+# Keys n8n may use in its JSON response to report the relevance verdict
+OUTCOME_KEYS = ("relevant", "is_relevant", "pertinent")
+
+
+def features(row):
+    feats = []
+    for field, prefix in FIELD_PREFIXES.items():
+        words = [w for w in normalize_text(str(row.get(field) or "")).split() if len(w) > 2]
+        feats.extend(f"{prefix}:{w}" for w in words)
+        if field == "objet":
+            feats.extend(f"o2:{a}_{b}" for a, b in zip(words, words[1:]))
+    return feats
+
+
+def train(records):
+    class_docs = Counter()
+    token_counts = {"1": Counter(), "0": Counter()}
+    for rec in records:
+        label = "1" if rec["relevant"] else "0"
+        class_docs[label] += 1
+        token_counts[label].update(features(rec))
+    vocab = set(token_counts["1"]) | set(token_counts["0"])
+    return {
+        "class_docs": dict(class_docs),
+        "token_counts": {k: dict(v) for k, v in token_counts.items()},
+        "token_totals": {k: sum(v.values()) for k, v in token_counts.items()},
+        "vocab_size": len(vocab),
+    }
+
+
+class RelevanceClassifier:
+    def __init__(self, model):
+        self.model = model
+        docs = model["class_docs"]
+        total_docs = sum(docs.values())
+        self.log_prior = {k: math.log(docs.get(k, 0) + 1) - math.log(total_docs + 2) for k in ("0", "1")}
+        vocab = model["vocab_size"] + 1
+        self.log_unseen = {
+            k: -math.log(model["token_totals"].get(k, 0) + vocab) for k in ("0", "1")
+        }
+        self.log_likelihood = {
+            k: {
+                tok: math.log(count + 1) + self.log_unseen[k]
+                for tok, count in model["token_counts"].get(k, {}).items()
+            }
+            for k in ("0", "1")
+        }
+
+    @classmethod
+    def load(cls, path=MODEL_PATH):
+        """Returns the trained classifier, or None when no model is available yet."""
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, encoding="utf-8") as f:
+                return cls(json.load(f))
+        except Exception as e:
+            print(f"⚠️ Could not load relevance model {path}: {e}")
+            return None
+
+    def score(self, row):
+        """Probability that the listing row is relevant."""
+        logp = dict(self.log_prior)
+        for tok in features(row):
+            for k in ("0", "1"):
+                logp[k] += self.log_likelihood[k].get(tok, self.log_unseen[k])
+        diff = max(min(logp["0"] - logp["1"], 700), -700)
+        return 1.0 / (1.0 + math.exp(diff))
+
+
+def outcome_from_response(resp):
+    """Reads the relevance verdict from the n8n webhook response, if any."""
+    try:
+        body = resp.json()
+    except ValueError:
+        return None
+    if isinstance(body, list) and body:
+        body = body[0]
+    if not isinstance(body, dict):
+        return None
+    for key in OUTCOME_KEYS:
+        if isinstance(body.get(key), bool):
+            return body[key]
+    return None
+
+
+def record_outcome(row, relevant, path=OUTCOMES_PATH):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    rec = {field: row.get(field, "") for field in FIELD_PREFIXES}
+    rec["relevant"] = bool(relevant)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+
+def load_outcomes(path=OUTCOMES_PATH):
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the local tender relevance classifier.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    train_cmd = sub.add_parser("train")
+    train_cmd.add_argument("--outcomes", default=OUTCOMES_PATH)
+    train_cmd.add_argument("--model", default=MODEL_PATH)
+    score_cmd = sub.add_parser("score")
+    score_cmd.add_argument("objet")
+    score_cmd.add_argument("--acheteur", default="")
+    score_cmd.add_argument("--lieux", default="")
+    score_cmd.add_argument("--model", default=MODEL_PATH)
+    args = parser.parse_args(argv)
+
+    if args.command == "train":
+        records = load_outcomes(args.outcomes)
+        if len(records) < MIN_TRAINING_EXAMPLES:
+            print(f"⚠️ Only {len(records)} outcomes, need at least {MIN_TRAINING_EXAMPLES} to train.")
+            return 1
+        model = train(records)
+        os.makedirs(os.path.dirname(os.path.abspath(args.model)), exist_ok=True)
+        with open(args.model, "w", encoding="utf-8") as f:
+            json.dump(model, f, ensure_ascii=False)
+        print(f"✅ Trained on {len(records)} outcomes ({model['class_docs']}), saved to {args.model}")
+        return 0
+
+    clf = RelevanceClassifier.load(args.model)
+    if clf is None:
+        print(f"⚠️ No model at {args.model}")
+        return 1
+    row = {"objet": args.objet, "acheteur": args.acheteur, "lieux_execution": args.lieux}
+    print(f"{clf.score(row):.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
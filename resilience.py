@@ -0,0 +1,112 @@
+"""
+Retry / deadline layer for the per-tender flow.
+
+  - Deadline:       overall time budget for one tender; every stage timeout
+                    is capped by what is left of it
+  - retry():        exponential backoff with jitter, never past the deadline
+  - CircuitBreaker: per-portal, pauses work when the recent error rate spikes
+
+Failed tenders are rescheduled through the work queue (work_queue.py).
+"""
+import os
+import time
+import random
+from collections import deque
+
+TENDER_DEADLINE = float(os.getenv("TENDER_DEADLINE", "420"))
+MAX_RETRY_ATTEMPTS = int(os.getenv("MAX_RETRY_ATTEMPTS", "3"))
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Deadline:
+    def __init__(self, seconds=TENDER_DEADLINE):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def budget(self, stage_timeout):
+        """Timeout for the next stage: its own limit, capped by what is left of the deadline."""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"tender deadline of {self.seconds:.0f}s exceeded")
+        return max(1.0, min(stage_timeout, remaining))
+
+
+def retry(func, attempts=3, base_delay=2.0, max_delay=30.0, deadline=None, retry_on=(Exception,), label="operation"):
+    """Calls func() until it succeeds, backing off exponentially between attempts."""
+    for attempt in range(1, attempts + 1):
+        try:
+            return func()
+        except DeadlineExceeded:
+            raise
+        except retry_on as e:
+            if attempt == attempts:
+                raise
+            cap = min(max_delay, base_delay * 2 ** (attempt - 1))
+            delay = cap / 2 + random.uniform(0, cap / 2)
+            if deadline is not None and deadline.remaining() <= delay:
+                raise
+            print(f"🔁 {label} failed ({type(e).__name__}), retry {attempt}/{attempts - 1} in {delay:.1f}s")
+            time.sleep(delay)
+
+
+class CircuitBreaker:
+    """
+    Opens when at least `failure_rate` of the last `window` calls failed,
+    then pauses for `cooldown` seconds before letting one trial call through.
+    After `max_trips` openings the portal is considered down for this run.
+    """
+
+    def __init__(self, name, window=10, failure_rate=0.5, min_calls=4, cooldown=180, max_trips=3):
+        self.name = name
+        self.results = deque(maxlen=window)
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.max_trips = max_trips
+        self.state = "closed"
+        self.opened_at = None
+        self.trips = 0
+
+    @property
+    def exhausted(self):
+        return self.trips > self.max_trips
+
+    def _open(self):
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.trips += 1
+        print(f"⛔ Circuit open for {self.name} (trip {self.trips}), pausing {self.cooldown}s.")
+
+    def record_success(self):
+        self.results.append(True)
+        if self.state == "half_open":
+            print(f"✅ Circuit closed for {self.name}.")
+            self.state = "closed"
+            self.results.clear()
+
+    def record_failure(self):
+        self.results.append(False)
+        if self.state == "half_open":
+            self._open()
+            return
+        if len(self.results) >= self.min_calls:
+            failures = sum(1 for ok in self.results if not ok)
+            if failures / len(self.results) >= self.failure_rate:
+                self._open()
+
+    def wait_if_open(self):
+        if self.state != "open":
+            return
+        pause = self.cooldown - (time.monotonic() - self.opened_at)
+        if pause > 0:
+            time.sleep(pause)
+        self.state = "half_open"
@@ -0,0 +1,513 @@
+"""
+One run over every portal.
+
+Each portal gets a thread that lists its tenders and works through its
+queue, while the expensive parts are shared by the whole process:
+  - BrowserPool:     Chrome sessions (browser.py)
+  - ExtractionPool:  sandboxed extraction workers (sandbox.py)
+  - DeliveryQueue:   n8n webhook POSTs (delivery.py)
+  - state/:          queue, duplicate, fingerprint and search indexes; every
+                     thread opens its own SQLite connections to the same files
+Daily wall time is roughly the slower portal rather than the sum of both.
+
+    python runner.py                  # every portal in PORTALS
+    python runner.py cdg              # only some
+    RUN_PORTALS=cdg python runner.py
+"""
+import os
+import sys
+import time
+import shutil
+import random
+import traceback
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures, FIRST_COMPLETED, ALL_COMPLETED
+
+# PDF / OCR / DOC / XLSX / ODT / RTF, in sandboxed worker processes
+from sandbox import ExtractionPool, safe_extract
+
+from field_extraction import extract_tender_fields, fields_complete
+from dedup import DuplicateIndex
+from relevance import RelevanceClassifier, RELEVANCE_MODE, RELEVANCE_THRESHOLD, outcome_from_response, record_outcome
+from resilience import Deadline, retry, CircuitBreaker
+from work_queue import WorkQueue, WORKER_ID, HEARTBEAT_SECONDS
+from search_index import SearchIndex
+from fingerprints import FingerprintStore, listing_fingerprint, page_fingerprint, archive_members, changed_members
+from downloads import tender_download_dir, set_download_dir, reset_dir, remove_dir, wait_for_download_complete
+from tender import compile_excluded, filter_excluded, write_csv
+from search_profile import load_profile
+from browser import BrowserPool
+from delivery import DeliveryQueue
+from listing import run_profile_search, backfill, parse_date, BackfillIncomplete, BACKFILL_START, BACKFILL_END
+
+# Selenium
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException, ElementClickInterceptedException
+
+# -----------------------------
+# CONFIGURATION
+# -----------------------------
+PORTALS = {
+    "marchespublics": {
+        "search_url": "https://www.marchespublics.gov.ma/index.php?page=entreprise.EntrepriseAdvancedSearch&searchAnnCons",
+        "webhook_env": "N8N_WEBHOOK_URL",
+    },
+    "cdg": {
+        "search_url": "https://safakat.cdg.ma/?page=entreprise.EntrepriseAdvancedSearch&searchAnnCons",
+        "webhook_env": "N8N_WEBHOOK_URL_2",
+    },
+}
+RUN_PORTALS = [p for p in os.getenv("RUN_PORTALS", "").split(",") if p]
+
+# "all": list then process, "list": only enqueue tenders, "work": only process queued tenders
+WORKER_MODE = os.getenv("WORKER_MODE", "all").lower()
+
+# Per-stage timeouts, each capped by the per-tender deadline
+PAGE_LOAD_TIMEOUT = 40
+ELEMENT_TIMEOUT = 25
+DOWNLOAD_TIMEOUT = 120
+DOWNLOAD_ATTEMPTS = 2
+# Deliveries a portal may have in flight before it waits for one to finish
+DELIVERY_BACKLOG = 3
+
+DCE_FORM_FIELDS = {
+    "ctl0_CONTENU_PAGE_EntrepriseFormulaireDemande_nom": "Lachhab",
+    "ctl0_CONTENU_PAGE_EntrepriseFormulaireDemande_prenom": "Anas",
+    "ctl0_CONTENU_PAGE_EntrepriseFormulaireDemande_email": "anas.lachhab@example.com"
+}
+
+
+class PortalRunner:
+    def __init__(self, portal, browsers, extraction_pool, delivery, download_dir, relevance, processed):
+        config = PORTALS[portal]
+        self.portal = portal
+        self.search_url = config["search_url"]
+        self.webhook = os.getenv(config["webhook_env"])
+        self.profile = load_profile(portal)
+        self.breaker = CircuitBreaker(portal)
+        self.browsers = browsers
+        self.extraction_pool = extraction_pool
+        self.delivery = delivery
+        self.download_dir = download_dir
+        self.relevance = relevance
+        self.processed = processed
+        self.in_flight = []
+        self.driver = None
+        self.backfill_missing = []
+
+    def run(self):
+        # SQLite connections belong to the thread that opened them
+        self.work_queue = WorkQueue()
+        self.dedup_index = DuplicateIndex()
+        self.search_index = SearchIndex()
+        self.fingerprint_store = FingerprintStore()
+        try:
+            if WORKER_MODE in ("all", "list"):
+                self.list_tenders()
+            if WORKER_MODE in ("all", "work"):
+                with self.browsers.session() as driver:
+                    self.driver = driver
+                    self.process_queue()
+        finally:
+            self.collect_deliveries(wait_all=True)
+            print(f"📊 Queue status for {self.portal}: {self.work_queue.counts(self.portal)}")
+            self.work_queue.close()
+            self.dedup_index.close()
+            self.search_index.close()
+            self.fingerprint_store.close()
+
+    # -----------------------------
+    # LISTING
+    # -----------------------------
+    def list_tenders(self):
+        print(f"\n--- Listing {self.portal} ---")
+        if BACKFILL_START:
+            # Backfill: windowed searches over the date range in parallel sessions
+            start = parse_date(BACKFILL_START)
+            end = parse_date(BACKFILL_END) if BACKFILL_END else (datetime.now() - timedelta(days=1)).date()
+            try:
+                tenders = backfill(self.search_url, start, end, self.browsers, profile=self.profile)
+            except BackfillIncomplete as e:
+                # Queue what was listed; main() fails the run and names the ranges to rerun
+                tenders = e.tenders
+                self.backfill_missing = e.missing
+        else:
+            # Daily run: everything published since yesterday
+            yesterday = (datetime.now() - timedelta(days=1)).date()
+            with self.browsers.session() as driver:
+                tenders = run_profile_search(driver, self.search_url, yesterday, profile=self.profile)
+
+        tenders = list(filter_excluded(tenders, compile_excluded(self.profile.excluded_keywords)))
+        print(f"✅ {self.portal}: {len(tenders)} valid tenders after filtering.\n")
+
+        # Local relevance score, trained from past n8n outcomes
+        if self.relevance is not None and tenders:
+            kept, skipped = [], 0
+            for t in tenders:
+                t.relevance_score = round(self.relevance.score(t), 3)
+                if t.relevance_score >= RELEVANCE_THRESHOLD:
+                    kept.append(t)
+                    continue
+                print(f"🔕 Low relevance ({t.relevance_score}): {t.objet[:80]}")
+                skipped += 1
+                if RELEVANCE_MODE != "enforce":
+                    kept.append(t)
+            if RELEVANCE_MODE == "enforce":
+                tenders = kept
+                print(f"✅ {self.portal}: {len(tenders)} tenders after relevance filter.\n")
+            else:
+                print(f"ℹ️ Shadow mode: {skipped} {self.portal} tenders would have been skipped.\n")
+
+        # Enqueue for the workers (already known tenders are ignored)
+        enqueued = sum(self.work_queue.enqueue(self.portal, t.to_dict(), listing_fingerprint(t)) for t in tenders)
+        print(f"📥 {self.portal}: {enqueued} new or changed tenders queued, {len(tenders) - enqueued} already known.\n")
+
+    # -----------------------------
+    # DOWNLOAD
+    # -----------------------------
+    def open_tender_page(self, link, deadline):
+        driver = self.driver
+        driver.set_page_load_timeout(deadline.budget(PAGE_LOAD_TIMEOUT))
+        try:
+            driver.get(link)
+        except TimeoutException:
+            print(f"⚠️ Timeout loading {link}, stopping page load...")
+            driver.execute_script("window.stop();")
+            if not driver.find_elements(By.ID, "ctl0_CONTENU_PAGE_linkDownloadDce"):
+                raise
+
+    def download_dce(self, link, deadline, target_dir, known_page=None):
+        """
+        Opens the tender page, fills the DCE request form and waits for the archive
+        in target_dir. Every wait is capped by what is left of the tender deadline.
+        Returns (downloaded file path, page fingerprint), raises on failure. The
+        path is None when the page still matches known_page: nothing to download.
+        """
+        driver = self.driver
+
+        def stage_wait(timeout=ELEMENT_TIMEOUT):
+            return WebDriverWait(driver, deadline.budget(timeout))
+
+        reset_dir(target_dir)
+        self.open_tender_page(link, deadline)
+        set_download_dir(driver, target_dir)
+        time.sleep(3)
+
+        download_link = stage_wait().until(EC.element_to_be_clickable((By.ID, "ctl0_CONTENU_PAGE_linkDownloadDce")))
+        page_fp = page_fingerprint(driver)
+        if page_fp is not None and page_fp == known_page:
+            return None, page_fp
+        driver.execute_script("arguments[0].scrollIntoView(true);", download_link)
+        download_link.click()
+
+        # Fill form
+        for fid, value in DCE_FORM_FIELDS.items():
+            inp = stage_wait().until(EC.presence_of_element_located((By.ID, fid)))
+            inp.clear()
+            inp.send_keys(value)
+
+        # Accept terms
+        checkbox = driver.find_element(By.ID, "ctl0_CONTENU_PAGE_EntrepriseFormulaireDemande_accepterConditions")
+        if not checkbox.is_selected():
+            checkbox.click()
+
+        valider_button = stage_wait().until(EC.element_to_be_clickable((By.ID, "ctl0_CONTENU_PAGE_validateButton")))
+        driver.execute_script("arguments[0].scrollIntoView({block:'center'});", valider_button)
+        time.sleep(0.5)
+        try:
+            valider_button.click()
+        except ElementClickInterceptedException:
+            driver.execute_script("arguments[0].click();", valider_button)
+
+        final_button = stage_wait().until(EC.element_to_be_clickable((By.ID, "ctl0_CONTENU_PAGE_EntrepriseDownloadDce_completeDownload")))
+        driver.execute_script("arguments[0].scrollIntoView(true);", final_button)
+        final_button.click()
+        print("✅ Download started.")
+
+        downloaded_file = wait_for_download_complete(target_dir, timeout=deadline.budget(DOWNLOAD_TIMEOUT))
+        if not downloaded_file:
+            raise TimeoutException("DCE download did not complete")
+        return downloaded_file, page_fp
+
+    # -----------------------------
+    # EXTRACTION
+    # -----------------------------
+    def extract_members(self, file_path, names):
+        """Extracts only the given archive members; returns {name: extracted path}."""
+        if not file_path.lower().endswith(".zip"):
+            name = os.path.basename(file_path)
+            return {name: file_path} if name in names else {}
+        extract_to = os.path.splitext(file_path)[0]
+        os.makedirs(extract_to, exist_ok=True)
+        return safe_extract(file_path, names, extract_to, self.extraction_pool.metrics)
+
+    def extract_documents(self, paths):
+        """
+        {name: (text, status)} for the given {name: path}; text is None when
+        skipped, unsupported or unreadable, status is the ExtractionResult's.
+        """
+        texts = {}
+        for name, fpath in paths.items():
+            if "cps" in os.path.basename(fpath).lower():
+                print(f"SKIPPED CPS: {os.path.basename(fpath)}")
+                texts[name] = (None, "ok")
+        wanted = {name: fpath for name, fpath in paths.items() if name not in texts}
+        results = self.extraction_pool.extract_many(list(wanted.values()))
+        for name, fpath in wanted.items():
+            fname = os.path.basename(fpath)
+            result = results[fpath]
+            if result.text is None:
+                print(f"SKIPPED {'UNSUPPORTED' if result.status == 'ok' else result.status.upper()}: {fname}")
+            elif result.partial:
+                print(f"PARTIAL {len(result.text)} chars from {fname} ({result.status})")
+            else:
+                print(f"EXTRACTED {len(result.text)} chars from {fname}")
+            texts[name] = (result.text, result.status)
+        return texts
+
+    # -----------------------------
+    # WORK LOOP
+    # -----------------------------
+    def process_queue(self):
+        # Claim queued tenders (this run's and earlier retries) until none is available
+        while True:
+            self.collect_deliveries(wait=len(self.in_flight) >= DELIVERY_BACKLOG)
+            job = self.work_queue.claim(self.portal)
+            if job is None:
+                break
+            if self.breaker.exhausted:
+                print(f"⛔ {self.portal} keeps failing, leaving remaining tenders for the next run.")
+                self.work_queue.release(job)
+                break
+            self.breaker.wait_if_open()
+            self.process_job(job)
+            time.sleep(random.uniform(2, 4))
+
+    def process_job(self, job):
+        row = job["payload"]
+        link = row['first_button_url']
+        print(f"\n🔗 [{self.portal}] Processing tender {row['reference']} (attempt {job['attempts']}): {link}")
+
+        listing_key = f"{row['objet']}\n{row['acheteur']}"
+        duplicate = self.dedup_index.find_duplicate("listing", listing_key, self.portal, row['reference'],
+                                                    deadline=row.get('date_limite'))
+        merged_text = "No document downloaded"
+        documents = []
+        tender_dir = None
+
+        if duplicate:
+            print(f"♻️ Near-duplicate of {duplicate['portal']}/{duplicate['reference']} "
+                  f"(similarity {duplicate['similarity']}), skipping download.")
+        else:
+            # Visible to the other portal right away, not only once n8n answered
+            self.dedup_index.add("listing", listing_key, self.portal, row['reference'], pending=True,
+                                 deadline=row.get('date_limite'))
+            deadline = Deadline()
+            tender_dir = tender_download_dir(self.download_dir, row['reference'])
+            known_page = self.fingerprint_store.page(self.portal, row['reference'])
+            stored = self.fingerprint_store.members(self.portal, row['reference'])
+            downloaded_file = page_fp = None
+            failure = None
+            # Downloads, extraction queued behind the other portal and OCR can outlast the lease
+            with self.work_queue.keep_leased(job):
+                try:
+                    downloaded_file, page_fp = retry(lambda: self.download_dce(link, deadline, tender_dir, known_page),
+                                                     attempts=DOWNLOAD_ATTEMPTS, deadline=deadline, label="DCE download")
+                    self.breaker.record_success()
+                except Exception as e:
+                    failure = e
+                    self.breaker.record_failure()
+                    print(f"⚠️ Error processing tender {link}: {e}")
+                    traceback.print_exc()
+
+                if failure is None:
+                    try:
+                        if downloaded_file is None:
+                            print("♻️ Tender page unchanged since the last extraction, reusing stored text.")
+                            members = stored
+                        else:
+                            # Only new or changed archive members are extracted again
+                            current = archive_members(downloaded_file)
+                            changed = changed_members(current, stored)
+                            print(f"📦 {len(current)} files, {len(changed)} new or changed.")
+                            extracted = self.extract_documents(self.extract_members(downloaded_file, changed))
+                            members, complete = {}, {}
+                            for name, (crc, size) in current.items():
+                                if name in extracted:
+                                    text, status = extracted[name]
+                                    members[name] = (crc, size, text)
+                                    if status == "ok":
+                                        complete[name] = members[name]
+                                elif name in stored:
+                                    members[name] = complete[name] = (crc, size, stored[name][2])
+                            # Timed out / crashed members are left out so the next run extracts them
+                            # again, and without a page fingerprint that next run downloads the DCE
+                            if len(complete) < len(members):
+                                page_fp = None
+                            self.fingerprint_store.save(self.portal, row['reference'], page_fp, downloaded_file, complete)
+
+                        texts = []
+                        for name, (_, _, text) in members.items():
+                            if text and text.strip():
+                                texts.append(text)
+                                documents.append((os.path.basename(name), text))
+
+                        merged_text = "\n\n".join(texts) or "No relevant text extracted"
+                    except Exception as e:
+                        print(f"⚠️ Error extracting tender {link}: {e}")
+                        traceback.print_exc()
+
+            # Failed tenders are retried on a later run instead of being dropped
+            if failure is not None and job["attempts"] < self.work_queue.max_attempts:
+                self.work_queue.fail(job, failure)
+                self.dedup_index.discard(self.portal, row['reference'])
+                print(f"🔁 Rescheduled for a later retry (attempt {job['attempts']}/{self.work_queue.max_attempts}).")
+                remove_dir(tender_dir)
+                return
+
+        tender_payload = dict(row)
+        document_key = f"{listing_key}\n{merged_text}"
+        if not duplicate and not documents:
+            # Nothing was extracted (last attempt failed, or unreadable DCE): the other portal's
+            # copy must not skip its own download because of this tender
+            self.dedup_index.discard(self.portal, row['reference'])
+        elif not duplicate:
+            duplicate = self.dedup_index.find_duplicate("document", document_key, self.portal, row['reference'],
+                                                        deadline=row.get('date_limite'))
+            if duplicate:
+                self.dedup_index.discard(self.portal, row['reference'])
+            else:
+                self.dedup_index.add("document", document_key, self.portal, row['reference'], pending=True,
+                                     deadline=row.get('date_limite'))
+
+        if duplicate:
+            # Lightweight reference to the original analysis ("pending" while it is still being delivered)
+            tender_payload["duplicate_of"] = duplicate
+            tender_payload["merged_text"] = ""
+        else:
+            tender_payload["merged_text"] = merged_text
+
+            # Local pre-extraction so n8n can skip / shorten the LLM call
+            extracted_fields = extract_tender_fields(merged_text)
+            tender_payload["extracted_fields"] = extracted_fields
+            tender_payload["extracted_fields_complete"] = fields_complete(extracted_fields)
+
+        # Keep the extracted text searchable once the files are wiped
+        self.search_index.add_tender(self.portal, row, documents)
+        self.processed.append(tender_payload)
+        remove_dir(tender_dir)
+
+        delivery = {"job": job, "payload": tender_payload, "duplicate": duplicate, "future": None}
+        if self.webhook:
+            self.work_queue.heartbeat(job)  # n8n can take up to 20 minutes
+            delivery["future"] = self.delivery.submit(self.webhook, tender_payload, label=f"[{self.portal}] ")
+            self.in_flight.append(delivery)
+        else:
+            self.finish_delivery(delivery, True, None)
+
+    # -----------------------------
+    # DELIVERY BOOKKEEPING
+    # -----------------------------
+    def collect_deliveries(self, wait=False, wait_all=False):
+        """
+        Completes finished deliveries; wait blocks until one has finished,
+        wait_all until every one has. Waits are cut into HEARTBEAT_SECONDS
+        slices so the leases of the deliveries still running are renewed.
+        """
+        while True:
+            still_running = []
+            for delivery in self.in_flight:
+                if delivery["future"].done():
+                    self.finish_delivery(delivery, *delivery["future"].result())
+                else:
+                    self.work_queue.heartbeat(delivery["job"])
+                    still_running.append(delivery)
+            if len(still_running) < len(self.in_flight):
+                wait = False  # a slot is free again
+            self.in_flight = still_running
+            if not still_running or not (wait or wait_all):
+                return
+            wait_futures([d["future"] for d in still_running], timeout=HEARTBEAT_SECONDS,
+                         return_when=ALL_COMPLETED if wait_all else FIRST_COMPLETED)
+
+    def finish_delivery(self, delivery, delivered, resp):
+        job, row = delivery["job"], delivery["payload"]
+        # A duplicate is sent without its text, n8n's verdict on it is no training label
+        if resp is not None and not delivery["duplicate"]:
+            outcome = outcome_from_response(resp)
+            if outcome is not None:
+                record_outcome(row, outcome)
+
+        # Pending signatures become regular ones once the analysis exists
+        if not delivery["duplicate"]:
+            if delivered:
+                self.dedup_index.confirm(self.portal, row['reference'])
+            else:
+                self.dedup_index.discard(self.portal, row['reference'])
+
+        if delivered:
+            self.work_queue.complete(job)
+        else:
+            self.work_queue.fail(job, "n8n delivery failed")
+
+
+# -----------------------------
+# MAIN SCRIPT
+# -----------------------------
+def main(portals=None):
+    portals = portals or RUN_PORTALS or list(PORTALS)
+    unknown = [p for p in portals if p not in PORTALS]
+    if unknown:
+        print(f"❌ Unknown portals {unknown}, expected some of {list(PORTALS)}")
+        return 2
+
+    print(f"🚀 Initializing run for {', '.join(portals)}...")
+    download_dir = os.path.join(os.getcwd(), "downloads_temp", WORKER_ID)
+    os.makedirs(download_dir, exist_ok=True)
+    browsers = BrowserPool(download_dir)
+    extraction_pool = ExtractionPool()
+    delivery = DeliveryQueue()
+    relevance = None
+    if RELEVANCE_MODE != "off" and WORKER_MODE in ("all", "list"):
+        relevance = RelevanceClassifier.load()
+    processed = []
+    runners = [PortalRunner(p, browsers, extraction_pool, delivery, download_dir, relevance, processed)
+               for p in portals]
+
+    failed = False
+    try:
+        with ThreadPoolExecutor(max_workers=len(runners), thread_name_prefix="portal") as pool:
+            futures = [pool.submit(runner.run) for runner in runners]
+            for runner, future in zip(runners, futures):
+                try:
+                    future.result()
+                except Exception:
+                    failed = True
+                    print(f"❌ {runner.portal} run failed:")
+                    traceback.print_exc()
+            for runner in runners:
+                for start, end, keyword in runner.backfill_missing:
+                    failed = True
+                    print(f"❌ {runner.portal} backfill gap, rerun with BACKFILL_START={start.isoformat()} "
+                          f"BACKFILL_END={end.isoformat()}" + (f" (keyword {keyword!r})" if keyword else ""))
+    finally:
+        delivery.close()
+        if processed:
+            out_path = os.path.join(os.getcwd(), "tender_results_summary.csv")
+            saved = write_csv(processed, out_path)
+            print(f"✅ Saved {saved} tenders to {out_path}")
+        else:
+            print("ℹ️ No tenders processed.")
+
+        extraction_pool.close()
+        print(f"📊 Extraction: {dict(extraction_pool.metrics)}")
+        browsers.close()
+        if os.path.exists(download_dir):
+            shutil.rmtree(download_dir)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
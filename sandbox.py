@@ -0,0 +1,284 @@
+"""
+Sandboxed document extraction.
+
+Every file goes through extract_text in a worker process that runs under
+an address-space limit (setrlimit) and a per-file wall-clock timeout. A
+worker that overruns is killed with its whole process group (tesseract,
+antiword) and replaced; workers are also recycled after EXTRACT_MAX_TASKS
+files so leaks do not pile up. PDF extraction reports its progress page by
+page, so a killed or crashed file still yields the text read so far.
+
+    pool = ExtractionPool()
+    results = pool.extract_many(paths)   # {path: ExtractionResult}
+    pool.metrics                         # Counter of ok / partial / timeout / ...
+
+safe_extract() unpacks DCE archives with limits on member count, sizes and
+compression ratio instead of a blind extractall.
+"""
+import os
+import time
+import signal
+import zipfile
+import threading
+import multiprocessing
+from collections import Counter
+from multiprocessing.connection import wait
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+from extractors import extract_text, clean_extracted_text
+
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", "2"))
+EXTRACT_MEMORY_MB = int(os.getenv("EXTRACT_MEMORY_MB", "1536"))
+EXTRACT_TIMEOUT = float(os.getenv("EXTRACT_TIMEOUT", "180"))
+EXTRACT_MAX_TASKS = int(os.getenv("EXTRACT_MAX_TASKS", "50"))
+
+ZIP_MAX_MEMBERS = int(os.getenv("ZIP_MAX_MEMBERS", "2000"))
+ZIP_MAX_TOTAL_MB = int(os.getenv("ZIP_MAX_TOTAL_MB", "2048"))
+ZIP_MAX_MEMBER_MB = int(os.getenv("ZIP_MAX_MEMBER_MB", "512"))
+ZIP_MAX_RATIO = 200  # for members over 1 MB: DCE documents compress well, but not a thousandfold
+
+# Workers are started from a fork server: the runner forks them from portal
+# threads, and forking a multi-threaded process can deadlock the child on a
+# lock another thread held (stdout, sqlite). Scripts without a __main__ guard,
+# which a fresh interpreter would re-run, must use "fork".
+EXTRACT_START_METHOD = os.getenv("EXTRACT_START_METHOD", "forkserver")
+
+
+class ExtractionResult:
+    __slots__ = ("text", "status", "seconds")
+
+    def __init__(self, text, status, seconds=0.0):
+        self.text = text      # None when unsupported or nothing could be read
+        self.status = status  # ok, timeout, memory, crashed, error
+        self.seconds = seconds
+
+    @property
+    def partial(self):
+        return self.status != "ok"
+
+    def __repr__(self):
+        return f"ExtractionResult({self.status}, {len(self.text or '')} chars, {self.seconds:.1f}s)"
+
+
+def _limit_resources(memory_mb):
+    os.setpgrp()  # lets the parent kill tesseract / antiword along with the worker
+    os.environ["OMP_THREAD_LIMIT"] = "1"  # tesseract threads reserve address space
+    if resource is not None and memory_mb:
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _worker_main(conn, memory_mb):
+    _limit_resources(memory_mb)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl-C is handled by the parent
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        path, options = task
+        try:
+            text = extract_text(path, partial=lambda t: conn.send(("partial", t)), **options)
+            conn.send(("ok", text))
+        except MemoryError:
+            conn.send(("memory", None))
+            return  # the heap may be fragmented, let the parent start a fresh worker
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+class _Worker:
+    def __init__(self, ctx, memory_mb):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child, memory_mb), daemon=True)
+        self.process.start()
+        child.close()
+        self.tasks = 0
+        self.path = None
+        self.started = None
+        self.partial = ""
+
+    def submit(self, path, options):
+        self.path, self.started, self.partial = path, time.monotonic(), ""
+        self.tasks += 1
+        self.conn.send((path, options))
+
+    def kill(self):
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            self.process.kill()
+        self.process.join(5)
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(2)
+        if self.process.is_alive():
+            self.kill()
+        else:
+            self.conn.close()
+
+
+class ExtractionPool:
+    def __init__(self, workers=EXTRACT_WORKERS, memory_mb=EXTRACT_MEMORY_MB,
+                 timeout=EXTRACT_TIMEOUT, max_tasks=EXTRACT_MAX_TASKS, start_method=EXTRACT_START_METHOD):
+        self.ctx = multiprocessing.get_context(start_method)
+        self.size = max(1, workers)
+        self.memory_mb = memory_mb
+        self.timeout = timeout
+        self.max_tasks = max_tasks
+        self.workers = []
+        self.metrics = Counter()
+        self.lock = threading.Lock()  # one batch at a time when portals share the pool
+
+    def extract(self, path, **options):
+        return self.extract_many([path], **options)[path]
+
+    def extract_many(self, paths, **options):
+        """Extracts the files in parallel; every path gets a result, however its worker ended."""
+        with self.lock:
+            return self._extract_many(paths, options)
+
+    def _extract_many(self, paths, options):
+        pending = list(dict.fromkeys(paths))
+        results = {}
+        while len(self.workers) < min(self.size, len(pending)):
+            self.workers.append(_Worker(self.ctx, self.memory_mb))
+        busy = {}
+
+        def finish(worker, status, text):
+            if status != "ok" and worker.partial:
+                text = clean_extracted_text(worker.partial)
+            seconds = time.monotonic() - worker.started
+            results[worker.path] = ExtractionResult(text, status, seconds)
+            self.metrics[status if status == "ok" or not text else f"{status}_partial"] += 1
+            if status != "ok":
+                print(f"⚠️ Extraction {status} after {seconds:.0f}s: {os.path.basename(worker.path)}")
+            del busy[worker.conn]
+
+        def replace(worker):
+            worker.kill()
+            self.workers[self.workers.index(worker)] = _Worker(self.ctx, self.memory_mb)
+
+        while pending or busy:
+            for worker in list(self.workers):
+                if not pending:
+                    break
+                if worker.conn in busy:
+                    continue
+                if worker.tasks >= self.max_tasks or not worker.process.is_alive():
+                    self.workers.remove(worker)
+                    worker.stop()
+                    worker = _Worker(self.ctx, self.memory_mb)
+                    self.workers.append(worker)
+                worker.submit(pending.pop(0), options)
+                busy[worker.conn] = worker
+
+            next_deadline = min(w.started + self.timeout for w in busy.values())
+            for conn in wait(list(busy), timeout=max(0.0, next_deadline - time.monotonic())):
+                worker = busy[conn]
+                try:
+                    kind, value = conn.recv()
+                except (EOFError, OSError):
+                    # Killed by the kernel (segfault, rlimit hit outside Python)
+                    finish(worker, "crashed", None)
+                    replace(worker)
+                    continue
+                if kind == "partial":
+                    worker.partial = value
+                elif kind == "ok":
+                    finish(worker, "ok", value)
+                elif kind == "memory":
+                    finish(worker, "memory", None)
+                    replace(worker)
+                else:
+                    print(f"⚠️ {value}")
+                    finish(worker, "error", None)
+
+            now = time.monotonic()
+            for worker in [w for w in busy.values() if now - w.started >= self.timeout]:
+                finish(worker, "timeout", None)
+                replace(worker)
+        return results
+
+    def close(self):
+        for worker in self.workers:
+            worker.stop()
+        self.workers = []
+
+
+class UnsafeArchive(Exception):
+    pass
+
+
+def _member_path(dest, name):
+    """Target path inside dest, whatever '..' or absolute parts the member name holds."""
+    parts = [p for p in name.replace("\\", "/").split("/") if p not in ("", ".", "..")]
+    return os.path.join(dest, *parts) if parts else None
+
+
+def _copy_capped(src, dst, limit):
+    written = 0
+    for chunk in iter(lambda: src.read(1 << 20), b""):
+        written += len(chunk)
+        if written > limit:
+            raise UnsafeArchive(f"member inflates beyond {limit // (1024 * 1024)} MB")
+        dst.write(chunk)
+    return written
+
+
+def safe_extract(zip_path, names, dest, metrics=None):
+    """
+    Extracts the given members into dest; returns {name: extracted path}.
+    Members over the size or ratio limits are skipped, and extraction stops
+    once ZIP_MAX_TOTAL_MB have actually been written. The central directory
+    can lie, so the sizes are enforced while inflating as well.
+    """
+    metrics = metrics if metrics is not None else Counter()
+    member_limit = ZIP_MAX_MEMBER_MB * 1024 * 1024
+    budget = ZIP_MAX_TOTAL_MB * 1024 * 1024
+    paths = {}
+    with zipfile.ZipFile(zip_path) as archive:
+        infos = [i for i in archive.infolist() if not i.is_dir()]
+        if len(infos) > ZIP_MAX_MEMBERS:
+            print(f"⚠️ {os.path.basename(zip_path)}: {len(infos)} members, over the limit of {ZIP_MAX_MEMBERS}.")
+            metrics["zip_rejected"] += 1
+            return paths
+        wanted = set(names)
+        for info in infos:
+            if info.filename not in wanted:
+                continue
+            target = _member_path(dest, info.filename)
+            ratio = info.file_size / max(1, info.compress_size)
+            if target is None or info.file_size > member_limit or (ratio > ZIP_MAX_RATIO and info.file_size > 1 << 20):
+                print(f"⚠️ Skipping suspicious archive member {info.filename} "
+                      f"({info.file_size} bytes, ratio {ratio:.0f}).")
+                metrics["zip_skipped"] += 1
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            try:
+                with archive.open(info) as src, open(target, "wb") as dst:
+                    budget -= _copy_capped(src, dst, min(member_limit, budget))
+            except UnsafeArchive as e:
+                print(f"⚠️ Stopped extracting {info.filename}: {e}")
+                metrics["zip_skipped"] += 1
+                os.remove(target)
+                if budget <= member_limit:
+                    break  # the whole archive budget is spent
+                continue
+            except (zipfile.BadZipFile, OSError) as e:
+                print(f"⚠️ Could not extract {info.filename}: {e}")
+                metrics["zip_skipped"] += 1
+                continue
+            paths[info.filename] = target
+    return paths
@@ -0,0 +1,175 @@
+"""
+Local full-text search over every tender the scrapers have processed.
+
+Each run upserts the tender (portal, reference) with its objet, acheteur,
+lieux, deadline and the text of every extracted document into a SQLite
+FTS5 index, so past DCEs stay searchable after the download directory is
+wiped.
+
+    python search_index.py "gardiennage rabat" [--portal cdg] [--limit 20]
+    python search_index.py --raw 'objet:étude NOT travaux'
+    python search_index.py --stats
+"""
+import os
+import re
+import sys
+import sqlite3
+import argparse
+from datetime import datetime
+
+from dedup import STATE_DIR
+
+DEFAULT_INDEX_PATH = os.getenv("SEARCH_INDEX_PATH", os.path.join(STATE_DIR, "tender_search.db"))
+
+# bm25 column weights: objet, acheteur, lieux, filename, text
+BM25_WEIGHTS = (5.0, 3.0, 2.0, 1.0, 1.0)
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def to_match_query(query):
+    """Turns free text into an FTS5 query where every word must match (prefix search on the last one)."""
+    words = _TOKEN_RE.findall(query)
+    if not words:
+        return None
+    terms = [f'"{w}"' for w in words[:-1]] + [f'"{words[-1]}"*']
+    return " ".join(terms)
+
+
+class SearchIndex:
+    def __init__(self, db_path=DEFAULT_INDEX_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=30)  # portals write from their own threads
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS tenders (
+                portal TEXT NOT NULL,
+                reference TEXT NOT NULL,
+                objet TEXT,
+                acheteur TEXT,
+                lieux_execution TEXT,
+                date_limite TEXT,
+                url TEXT,
+                indexed_at TEXT NOT NULL,
+                PRIMARY KEY (portal, reference)
+            );
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY,
+                portal TEXT NOT NULL,
+                reference TEXT NOT NULL,
+                objet TEXT,
+                acheteur TEXT,
+                lieux_execution TEXT,
+                filename TEXT,
+                text TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_documents_tender ON documents (portal, reference);
+            CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5 (
+                objet, acheteur, lieux_execution, filename, text,
+                content='documents', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            );
+            CREATE TRIGGER IF NOT EXISTS documents_ai AFTER INSERT ON documents BEGIN
+                INSERT INTO documents_fts (rowid, objet, acheteur, lieux_execution, filename, text)
+                VALUES (new.id, new.objet, new.acheteur, new.lieux_execution, new.filename, new.text);
+            END;
+            CREATE TRIGGER IF NOT EXISTS documents_ad AFTER DELETE ON documents BEGIN
+                INSERT INTO documents_fts (documents_fts, rowid, objet, acheteur, lieux_execution, filename, text)
+                VALUES ('delete', old.id, old.objet, old.acheteur, old.lieux_execution, old.filename, old.text);
+            END;
+        """)
+
+    def add_tender(self, portal, row, documents):
+        """
+        Replaces everything indexed for (portal, reference).
+        documents is a list of (filename, text); a tender without documents
+        is still searchable by its listing fields.
+        """
+        reference = row["reference"]
+        listing = (row.get("objet"), row.get("acheteur"), row.get("lieux_execution"))
+        with self.conn:
+            self.conn.execute("DELETE FROM documents WHERE portal = ? AND reference = ?", (portal, reference))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO tenders VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (portal, reference) + listing + (row.get("date_limite"), row.get("first_button_url"), datetime.now().isoformat()),
+            )
+            self.conn.executemany(
+                "INSERT INTO documents (portal, reference, objet, acheteur, lieux_execution, filename, text) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(portal, reference) + listing + (fname, text) for fname, text in (documents or [("", "")])],
+            )
+
+    def search(self, query, portal=None, limit=20, raw=False):
+        """Returns the best matching tenders, one hit per tender, best first."""
+        match = query if raw else to_match_query(query)
+        if not match:
+            return []
+        sql = (
+            "SELECT d.portal, d.reference, t.objet, t.acheteur, t.date_limite, t.url, d.filename, "
+            "snippet(documents_fts, -1, '[', ']', '…', 12), "
+            "bm25(documents_fts, ?, ?, ?, ?, ?) AS score "
+            "FROM documents_fts JOIN documents d ON d.id = documents_fts.rowid "
+            "JOIN tenders t ON t.portal = d.portal AND t.reference = d.reference "
+            "WHERE documents_fts MATCH ?"
+        )
+        args = list(BM25_WEIGHTS) + [match]
+        if portal:
+            sql += " AND d.portal = ?"
+            args.append(portal)
+        sql += " ORDER BY score LIMIT ?"
+        args.append(limit * 5)
+
+        hits, seen = [], set()
+        for portal_, reference, objet, acheteur, date_limite, url, filename, snippet, score in self.conn.execute(sql, args):
+            if (portal_, reference) in seen:
+                continue
+            seen.add((portal_, reference))
+            hits.append({
+                "portal": portal_, "reference": reference, "objet": objet, "acheteur": acheteur,
+                "date_limite": date_limite, "url": url, "filename": filename,
+                "snippet": snippet, "score": round(-score, 3),
+            })
+            if len(hits) >= limit:
+                break
+        return hits
+
+    def stats(self):
+        tenders = self.conn.execute("SELECT portal, COUNT(*) FROM tenders GROUP BY portal").fetchall()
+        documents = self.conn.execute("SELECT COUNT(*) FROM documents WHERE filename != ''").fetchone()[0]
+        return {"tenders": dict(tenders), "documents": documents}
+
+    def close(self):
+        self.conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search historical tenders.")
+    parser.add_argument("query", nargs="?")
+    parser.add_argument("--portal")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--raw", action="store_true", help="pass the query to FTS5 as is")
+    parser.add_argument("--stats", action="store_true")
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH)
+    args = parser.parse_args(argv)
+
+    index = SearchIndex(args.index)
+    try:
+        if args.stats or not args.query:
+            print(index.stats())
+            return 0
+        try:
+            hits = index.search(args.query, portal=args.portal, limit=args.limit, raw=args.raw)
+        except sqlite3.OperationalError as e:
+            print(f"❌ Invalid query: {e}")
+            return 1
+        for hit in hits:
+            print(f"[{hit['score']}] {hit['portal']}/{hit['reference']} - {hit['objet'][:90]}")
+            print(f"    {hit['acheteur']} | {hit['date_limite']} | {hit['filename'] or 'listing'}")
+            print(f"    {hit['snippet']}")
+        if not hits:
+            print("ℹ️ No match.")
+        return 0
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""
+Declarative search profiles, one per portal, applied through the portal's
+AdvancedSearch form so it only returns candidate rows.
+
+search_profiles.json:
+    {
+      "<portal>": {
+        "categories": ["services"],          # travaux / fournitures / services
+        "keywords": ["étude", "audit"],      # one server-side search per keyword, rows merged
+        "excluded_keywords": ["travaux"],    # no portal field for this, filtered client-side
+        "procedure": "Appel d'offres ouvert", # visible text of the procedure type option
+        "buyer": "",                         # visible text of the public entity option
+        "region": "",                        # lieu d'exécution label in the popup
+        "fields": {}                         # optional overrides of FORM_FIELDS element ids
+      }
+    }
+"""
+import os
+import json
+
+from tender import EXCLUDED_WORDS
+
+SEARCH_PROFILES_PATH = os.getenv(
+    "SEARCH_PROFILES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "search_profiles.json")
+)
+
+CATEGORY_CHECKBOXES = {
+    "travaux": "ctl0_CONTENU_PAGE_repeaterCategorie_ctl0_idCategorie",
+    "fournitures": "ctl0_CONTENU_PAGE_repeaterCategorie_ctl1_idCategorie",
+    "services": "ctl0_CONTENU_PAGE_repeaterCategorie_ctl2_idCategorie",
+}
+
+FORM_FIELDS = {
+    "categories_link": "ctl0_CONTENU_PAGE_AdvancedSearch_domaineActivite_linkDisplay",
+    "popup_validate": "ctl0_CONTENU_PAGE_validateButton",
+    "keywords": "ctl0_CONTENU_PAGE_AdvancedSearch_keywordSearch",
+    "procedure": "ctl0_CONTENU_PAGE_AdvancedSearch_procedureType",
+    "buyer": "ctl0_CONTENU_PAGE_AdvancedSearch_organismesNames",
+    "region_link": "ctl0_CONTENU_PAGE_AdvancedSearch_lieuExecution_linkDisplay",
+}
+
+
+class SearchProfile:
+    __slots__ = ("portal", "categories", "keywords", "excluded_keywords", "procedure", "buyer", "region", "fields")
+
+    def __init__(self, portal, categories=(), keywords=(), excluded_keywords=None,
+                 procedure="", buyer="", region="", fields=None):
+        self.portal = portal
+        self.categories = [c.lower() for c in categories]
+        self.keywords = list(keywords)
+        self.excluded_keywords = list(EXCLUDED_WORDS if excluded_keywords is None else excluded_keywords)
+        self.procedure = procedure
+        self.buyer = buyer
+        self.region = region
+        self.fields = dict(FORM_FIELDS, **(fields or {}))
+
+        unknown = [c for c in self.categories if c not in CATEGORY_CHECKBOXES]
+        if unknown:
+            raise ValueError(f"Unknown categories {unknown} in search profile {portal!r}")
+
+    def __repr__(self):
+        return f"SearchProfile({self.portal!r}, categories={self.categories}, keywords={self.keywords})"
+
+
+def load_profile(portal, path=SEARCH_PROFILES_PATH):
+    """Returns the portal's profile, or a profile with only the default exclusions."""
+    if not os.path.exists(path):
+        return SearchProfile(portal)
+    with open(path, encoding="utf-8") as f:
+        profiles = json.load(f)
+    return SearchProfile(portal, **profiles.get(portal, {}))
@@ -0,0 +1,79 @@
+"""
+Compact tender record and the streaming filter / CSV helpers used by the
+scrapers instead of pandas.
+"""
+import os
+import re
+import csv
+import json
+
+EXCLUDED_WORDS = ["construction", "installation", "travaux", "fourniture", "achat", "equipement", "supply", "acquisition", "nettoyage", "déchets"]
+
+
+class Tender:
+    """One listing row. __slots__ keeps thousands of them cheap to hold."""
+
+    __slots__ = ("reference", "objet", "acheteur", "lieux_execution", "date_limite", "first_button_url", "relevance_score")
+
+    def __init__(self, reference, objet, acheteur, lieux_execution, date_limite, first_button_url, relevance_score=None):
+        self.reference = reference
+        self.objet = objet
+        self.acheteur = acheteur
+        self.lieux_execution = lieux_execution
+        self.date_limite = date_limite
+        self.first_button_url = first_button_url
+        self.relevance_score = relevance_score
+
+    def to_dict(self):
+        d = {name: getattr(self, name) for name in self.__slots__}
+        if d["relevance_score"] is None:
+            del d["relevance_score"]
+        return d
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(**{name: d.get(name) for name in cls.__slots__})
+
+    def get(self, name, default=None):
+        """Dict-style access so a Tender can be scored like a payload row."""
+        return getattr(self, name, default)
+
+    def __repr__(self):
+        return f"Tender({self.reference!r}, {self.objet[:40]!r})"
+
+
+def compile_excluded(words=EXCLUDED_WORDS):
+    """Pattern matching any excluded word, or None when there is none (an empty pattern matches everything)."""
+    words = [w for w in words if w]
+    if not words:
+        return None
+    return re.compile("|".join(re.escape(w) for w in words), re.IGNORECASE)
+
+
+def filter_excluded(tenders, pattern):
+    """Yields the tenders whose objet does not contain an excluded word; all of them when pattern is None."""
+    for tender in tenders:
+        if pattern is None or not pattern.search(tender.objet or ""):
+            yield tender
+
+
+def _csv_value(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def write_csv(records, out_path):
+    """Writes payload dicts to CSV, columns in order of first appearance. Returns the row count."""
+    columns = []
+    for record in records:
+        for key in record:
+            if key not in columns:
+                columns.append(key)
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    with open(out_path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        for record in records:
+            writer.writerow({k: _csv_value(v) for k, v in record.items()})
+    return len(records)
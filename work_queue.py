@@ -0,0 +1,217 @@
+"""
+Durable SQLite job queue for tenders, so the download + extract + deliver
+flow can be spread over several worker processes.
+
+The listing phase enqueues one job per tender (portal, reference). Workers
+claim jobs under a lease; a worker that crashes simply stops renewing its
+lease and the job becomes claimable again once the lease expires. Failed
+jobs are rescheduled with exponential backoff until MAX_ATTEMPTS, and so
+are jobs whose lease keeps expiring (a worker killed or hung on them). A done
+or failed tender whose listing fingerprint changed (an amendment) is
+queued again from scratch.
+
+Workers sharing one database file need a common filesystem. Matrix jobs
+that each get a copy of the database can split it with WORKER_SHARD=i/n.
+"""
+import os
+import json
+import time
+import socket
+import sqlite3
+import threading
+from datetime import datetime
+from contextlib import contextmanager
+
+from dedup import STATE_DIR
+from resilience import MAX_RETRY_ATTEMPTS
+
+DEFAULT_QUEUE_PATH = os.getenv("WORK_QUEUE_PATH", os.path.join(STATE_DIR, "work_queue.db"))
+# Must cover the tender deadline plus the (slow) n8n delivery
+LEASE_SECONDS = float(os.getenv("WORK_LEASE_SECONDS", "1800"))
+# How often a worker renews the leases of the jobs it holds
+HEARTBEAT_SECONDS = float(os.getenv("WORK_HEARTBEAT_SECONDS", "300"))
+RETRY_BASE_DELAY = float(os.getenv("WORK_RETRY_DELAY", "3600"))
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}"
+
+
+def parse_shard(value):
+    """'1/4' -> (1, 4); empty -> None."""
+    if not value:
+        return None
+    index, count = value.split("/")
+    return int(index), int(count)
+
+
+WORKER_SHARD = parse_shard(os.getenv("WORKER_SHARD", ""))
+
+
+class WorkQueue:
+    def __init__(self, db_path=DEFAULT_QUEUE_PATH, lease_seconds=LEASE_SECONDS, max_attempts=MAX_RETRY_ATTEMPTS):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        # Autocommit mode: transactions are opened explicitly with BEGIN IMMEDIATE
+        self.conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                portal TEXT NOT NULL,
+                reference TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                available_at REAL NOT NULL,
+                lease_owner TEXT,
+                lease_expires REAL,
+                last_error TEXT,
+                fingerprint TEXT,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                UNIQUE (portal, reference)
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs (portal, status, available_at);
+        """)
+        # Queues created before change detection
+        columns = [r["name"] for r in self.conn.execute("PRAGMA table_info(jobs)")]
+        if "fingerprint" not in columns:
+            self.conn.execute("ALTER TABLE jobs ADD COLUMN fingerprint TEXT")
+
+    def enqueue(self, portal, row, fingerprint=None):
+        """
+        Adds a tender; returns False when it was already queued or processed
+        unchanged. A processed tender with a different fingerprint is reset
+        to pending with the new payload.
+        """
+        now = datetime.now().isoformat()
+        payload = json.dumps(row, ensure_ascii=False)
+        cur = self.conn.execute(
+            "INSERT OR IGNORE INTO jobs (portal, reference, payload, available_at, fingerprint, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (portal, row["reference"], payload, time.time(), fingerprint, now, now),
+        )
+        if cur.rowcount == 1 or fingerprint is None:
+            return cur.rowcount == 1
+        cur = self.conn.execute(
+            "UPDATE jobs SET payload = ?, fingerprint = ?, status = 'pending', attempts = 0, available_at = ?, "
+            "last_error = NULL, updated_at = ? WHERE portal = ? AND reference = ? "
+            "AND status IN ('done', 'failed') AND fingerprint IS NOT NULL AND fingerprint != ?",
+            (payload, fingerprint, time.time(), now, portal, row["reference"], fingerprint),
+        )
+        if cur.rowcount == 1:
+            print(f"🔄 {row['reference']} changed since it was processed, queued again.")
+            return True
+        # Jobs queued before change detection get their first fingerprint
+        self.conn.execute(
+            "UPDATE jobs SET fingerprint = ? WHERE portal = ? AND reference = ? AND fingerprint IS NULL",
+            (fingerprint, portal, row["reference"]),
+        )
+        return False
+
+    def claim(self, portal, worker_id=WORKER_ID, shard=WORKER_SHARD):
+        """Leases the next available job, including jobs whose lease has expired."""
+        now = time.time()
+        shard_sql, shard_args = "", ()
+        if shard:
+            shard_sql, shard_args = " AND id % ? = ?", (shard[1], shard[0])
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            # A job whose worker died or hung on its last attempt is not handed out again
+            self.conn.execute(
+                "UPDATE jobs SET status = 'failed', last_error = 'lease expired on the last attempt', "
+                "lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+                "WHERE portal = ? AND status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (datetime.now().isoformat(), portal, now, self.max_attempts),
+            )
+            row = self.conn.execute(
+                "SELECT * FROM jobs WHERE portal = ? AND ("
+                " (status = 'pending' AND available_at <= ?)"
+                " OR (status = 'leased' AND lease_expires < ?))" + shard_sql +
+                " ORDER BY available_at, id LIMIT 1",
+                (portal, now, now) + shard_args,
+            ).fetchone()
+            if row is None:
+                self.conn.execute("COMMIT")
+                return None
+            if row["status"] == "leased":
+                print(f"♻️ Reclaiming job {row['reference']} from expired lease of {row['lease_owner']}")
+            self.conn.execute(
+                "UPDATE jobs SET status = 'leased', lease_owner = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (worker_id, now + self.lease_seconds, datetime.now().isoformat(), row["id"]),
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return {
+            "id": row["id"],
+            "reference": row["reference"],
+            "attempts": row["attempts"] + 1,
+            "payload": json.loads(row["payload"]),
+        }
+
+    def _update_leased(self, job, sql, args, worker_id):
+        cur = self.conn.execute(
+            f"UPDATE jobs SET {sql}, updated_at = ? WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+            args + (datetime.now().isoformat(), job["id"], worker_id),
+        )
+        if cur.rowcount != 1:
+            print(f"⚠️ Lost the lease on job {job['reference']}, another worker may have taken it.")
+        return cur.rowcount == 1
+
+    def heartbeat(self, job, worker_id=WORKER_ID):
+        return self._update_leased(job, "lease_expires = ?", (time.time() + self.lease_seconds,), worker_id)
+
+    @contextmanager
+    def keep_leased(self, job, interval=HEARTBEAT_SECONDS, worker_id=WORKER_ID):
+        """Renews the job's lease from a background thread while the block runs (download, extraction)."""
+        stop = threading.Event()
+
+        def renew():
+            queue = WorkQueue(self.db_path, self.lease_seconds, self.max_attempts)  # connections are per thread
+            try:
+                while not stop.wait(interval):
+                    queue.heartbeat(job, worker_id)
+            finally:
+                queue.close()
+
+        thread = threading.Thread(target=renew, name=f"lease-{job['reference']}", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def complete(self, job, worker_id=WORKER_ID):
+        return self._update_leased(job, "status = 'done', lease_owner = NULL, lease_expires = NULL", (), worker_id)
+
+    def fail(self, job, error, worker_id=WORKER_ID):
+        """Reschedules the job with exponential backoff, or marks it failed after max_attempts."""
+        if job["attempts"] >= self.max_attempts:
+            return self._update_leased(
+                job, "status = 'failed', last_error = ?, lease_owner = NULL, lease_expires = NULL",
+                (str(error)[:500],), worker_id,
+            )
+        delay = RETRY_BASE_DELAY * 2 ** (job["attempts"] - 1)
+        return self._update_leased(
+            job, "status = 'pending', last_error = ?, available_at = ?, lease_owner = NULL, lease_expires = NULL",
+            (str(error)[:500], time.time() + delay), worker_id,
+        )
+
+    def release(self, job, delay=0, worker_id=WORKER_ID):
+        """Gives the job back without counting the attempt."""
+        return self._update_leased(
+            job, "status = 'pending', attempts = attempts - 1, available_at = ?, lease_owner = NULL, lease_expires = NULL",
+            (time.time() + delay,), worker_id,
+        )
+
+    def counts(self, portal):
+        rows = self.conn.execute("SELECT status, COUNT(*) FROM jobs WHERE portal = ? GROUP BY status", (portal,))
+        return dict(rows.fetchall())
+
+    def close(self):
+        self.conn.close()